@@ -5,57 +5,20 @@ import os
 import logging
 import sys
 import subprocess
-import shutil
-import atexit
-import venv
 import argparse
 import json
+from scripts.venv_cache import create_venv, venv_python
 
 # Set up logging
 logging.basicConfig(level=logging.INFO)
 
-def create_venv():
-    venv_path = os.path.expanduser('~/.website_creator_venv')
-    if not os.path.exists(venv_path):
-        logging.info(f"Creating virtual environment at {venv_path}")
-        try:
-            # Create venv without pip first
-            venv.create(venv_path, with_pip=False)
-            
-            # Get the Python executable path in the new venv
-            if sys.platform == 'win32':
-                python_path = os.path.join(venv_path, 'Scripts', 'python.exe')
-            else:
-                python_path = os.path.join(venv_path, 'bin', 'python')
-            
-            # Install pip using get-pip.py
-            subprocess.run(['curl', 'https://bootstrap.pypa.io/get-pip.py', '-o', 'get-pip.py'], check=True)
-            subprocess.run([python_path, 'get-pip.py'], check=True)
-            os.remove('get-pip.py')
-            
-            # Update pip to latest version
-            subprocess.run([os.path.join(os.path.dirname(python_path), 'pip'), 'install', '--upgrade', 'pip'], check=True)
-        except Exception as e:
-            logging.error(f"Failed to create virtual environment: {str(e)}")
-            if os.path.exists(venv_path):
-                shutil.rmtree(venv_path)
-            raise
-    return venv_path
-
-def install_dependencies(pip_executable):
-    required_packages = [
-        'requests',
-        'python-dotenv',
-        'boto3>=1.34.0',  # Ensure latest stable version with CloudFront support
-        'botocore>=1.34.0'
-    ]
-    for package in required_packages:
-        subprocess.run([pip_executable, 'install', package], check=True)
-
-def cleanup_venv(venv_path):
-    if os.path.exists(venv_path):
-        logging.info(f"Cleaning up virtual environment at {venv_path}")
-        shutil.rmtree(venv_path)
+REQUIRED_PACKAGES = [
+    'requests',
+    'python-dotenv',
+    'boto3>=1.34.0',  # Ensure latest stable version with CloudFront support
+    'botocore>=1.34.0',
+    'Pillow>=11.2',  # AVIF encoding built in
+]
 
 def sanitize_domain_name(domain_name):
     """Sanitize the domain name to create a repo name."""
@@ -195,25 +158,17 @@ def main():
     args = parser.parse_args()
 
     if not args.venv_activated:
-        # Create and activate virtual environment
-        venv_path = create_venv()
-        atexit.register(cleanup_venv, venv_path)
+        # Reuse (or build once) the cached virtual environment, then replace this
+        # process with the script running inside it
         try:
-            # Install dependencies in the virtual environment
-            pip_executable = os.path.join(venv_path, 'bin', 'pip') if sys.platform != 'win32' else os.path.join(venv_path, 'Scripts', 'pip')
-            install_dependencies(pip_executable)
-
-            # Re-invoke the script using the virtual environment's Python executable
-            python_executable = os.path.join(venv_path, 'bin', 'python') if sys.platform != 'win32' else os.path.join(venv_path, 'Scripts', 'python.exe')
-            logging.info("Re-invoking script inside virtual environment...")
-            subprocess.run([python_executable, *sys.argv, '--venv-activated'], check=True)
-
+            python_executable = venv_python(create_venv(REQUIRED_PACKAGES))
         except Exception as e:
             logging.error(f"An error occurred during setup: {str(e)}")
             raise
-        finally:
-            cleanup_venv(venv_path)
-        sys.exit(0)
+        command = [python_executable, os.path.abspath(__file__), *sys.argv[1:], '--venv-activated']
+        if sys.platform == 'win32':
+            sys.exit(subprocess.run(command).returncode)
+        os.execv(python_executable, command)
 
     # The script is now running inside the virtual environment
     from dotenv import load_dotenv
@@ -266,8 +221,8 @@ def main():
     # Set PYTHONPATH environment variable
     os.environ['PYTHONPATH'] = f"{scripts_dir}:{os.environ.get('PYTHONPATH', '')}"
     # Run main script using the virtual environment's Python executable
-    venv_python = sys.executable
-    subprocess.run([venv_python, '-m', 'scripts.main'], check=True, env=os.environ)
+    python_executable = sys.executable
+    subprocess.run([python_executable, '-m', 'scripts.main'], check=True, env=os.environ)
 
     logging.info(f"Website setup complete for {domain_name}")
 
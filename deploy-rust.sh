@@ -9,21 +9,6 @@ log() {
     echo "[$timestamp] ${level}: ${message}"
 }
 
-get_terraform_outputs() {
-    log "INFO" "Retrieving Terraform outputs..."
-    cd terraform
-    S3_BUCKET_NAME=$(terraform output -raw s3_bucket_name)
-    CLOUDFRONT_DISTRIBUTION_ID=$(terraform output -raw cloudfront_distribution_id)
-    cd ..
-    
-    if [ -z "$S3_BUCKET_NAME" ] || [ -z "$CLOUDFRONT_DISTRIBUTION_ID" ]; then
-        log "ERROR" "Failed to retrieve Terraform outputs"
-        exit 1
-    fi
-    
-    log "SUCCESS" "Retrieved Terraform outputs"
-}
-
 build_leptos() {
     log "INFO" "Starting Leptos build..."
     cd leptos-app
@@ -51,60 +36,23 @@ build_leptos() {
     log "SUCCESS" "Build completed"
 }
 
-sync_s3_bucket() {
-    log "INFO" "Syncing with S3..."
-    
-    if ! aws s3 rm "s3://$S3_BUCKET_NAME" --recursive; then
-        log "ERROR" "Failed to clean bucket"
-        exit 1
-    fi
-    
-    if ! aws s3 sync "leptos-app/target/site" "s3://$S3_BUCKET_NAME" \
-        --delete \
-        --cache-control "no-cache" \
-        --content-type "text/html" \
-        --exclude "*" \
-        --include "index.html"; then
-        log "ERROR" "Failed to sync index.html"
-        exit 1
-    fi
-    
-    if ! aws s3 sync "leptos-app/target/site" "s3://$S3_BUCKET_NAME" \
-        --delete \
-        --cache-control "public, max-age=31536000, immutable" \
-        --exclude "*" \
-        --include "*.js" \
-        --include "*.wasm" \
-        --include "*.css" \
-        --include "pkg/*"; then
-        log "ERROR" "Failed to sync assets"
-        exit 1
-    fi
-    
-    log "SUCCESS" "Sync completed"
-}
-
-invalidate_cloudfront() {
-    log "INFO" "Invalidating CloudFront..."
+deploy_site() {
+    log "INFO" "Deploying leptos-app/target/site..."
     
-    if ! aws cloudfront create-invalidation \
-        --distribution-id "$CLOUDFRONT_DISTRIBUTION_ID" \
-        --paths "/*" \
-        --query 'Invalidation.Id' \
-        --output text > /dev/null; then
-        log "ERROR" "Invalidation failed"
+    # Upload the build as an immutable release (scripts/upload_policy.py headers),
+    # then switch the CloudFront origin path to it and invalidate changed paths
+    if ! python3 -m scripts.deploy_website --source-dir leptos-app/target/site --release; then
+        log "ERROR" "Deployment failed"
         exit 1
     fi
     
-    log "SUCCESS" "Invalidation created"
+    log "SUCCESS" "Deployment completed"
 }
 
 main() {
     log "INFO" "Starting deployment..."
     build_leptos
-    get_terraform_outputs
-    sync_s3_bucket
-    invalidate_cloudfront
+    deploy_site
     log "SUCCESS" "🚀 Deployment completed!"
 }
 
@@ -0,0 +1,77 @@
+# File: scripts/aws_clients.py
+
+import os
+import logging
+import threading
+
+# Set up logging
+logging.basicConfig(level=logging.INFO)
+
+# One boto3 session per profile and one client per (profile, service, region)
+# for the whole process, so credentials, endpoint data and TLS connections
+# are resolved once instead of in every stage.
+DEFAULT_POOL_CONNECTIONS = 10
+RETRIES = {'max_attempts': 5, 'mode': 'adaptive'}
+
+_sessions = {}
+_clients = {}
+_account_ids = {}
+_lock = threading.Lock()
+
+def resolve_profile(profile=None):
+    """The profile to use: the argument, else AWS_PROFILE or AWS_DEFAULT_PROFILE."""
+    return profile or os.environ.get('AWS_PROFILE') or os.environ.get('AWS_DEFAULT_PROFILE') or None
+
+def get_session(profile=None):
+    """Return the shared boto3 session for a profile."""
+    profile = resolve_profile(profile)
+    with _lock:
+        session = _sessions.get(profile)
+        if session is None:
+            import boto3
+            session = boto3.Session(profile_name=profile)
+            _sessions[profile] = session
+        return session
+
+def get_client(service, region=None, profile=None, max_pool_connections=None):
+    """Return the shared client for (profile, service, region).
+
+    The connection pool holds at least max_pool_connections connections; a
+    client cached with a smaller pool is replaced by a larger one.
+    """
+    profile = resolve_profile(profile)
+    pool_size = max(max_pool_connections or 0, DEFAULT_POOL_CONNECTIONS)
+    key = (profile, service, region)
+    with _lock:
+        cached = _clients.get(key)
+        if cached and cached[1] >= pool_size:
+            return cached[0]
+    from botocore.config import Config
+    config = Config(
+        max_pool_connections=pool_size,
+        retries=dict(RETRIES),
+        tcp_keepalive=True
+    )
+    session = get_session(profile)
+    with _lock:
+        # Clients are thread-safe, but creating them from one session is not
+        cached = _clients.get(key)
+        if cached and cached[1] >= pool_size:
+            return cached[0]
+        client = session.client(service, region_name=region, config=config)
+        _clients[key] = (client, pool_size)
+        return client
+
+def get_account_id(profile=None):
+    """Return the AWS account ID for a profile, calling STS only once."""
+    profile = resolve_profile(profile)
+    if profile not in _account_ids:
+        _account_ids[profile] = get_client('sts', profile=profile).get_caller_identity()['Account']
+    return _account_ids[profile]
+
+def clear_clients():
+    """Forget every cached session and client (e.g. after changing endpoints)."""
+    with _lock:
+        _sessions.clear()
+        _clients.clear()
+        _account_ids.clear()
@@ -0,0 +1,316 @@
+# File: scripts/benchmark_deploy.py
+
+import os
+import sys
+import json
+import time
+import random
+import shutil
+import logging
+import argparse
+import resource
+import tempfile
+import statistics
+import contextlib
+import subprocess
+from datetime import datetime, timezone
+from scripts.deploy_website import get_site_hash, annotate_manifest
+from scripts.site_manifest import build_manifest, diff_manifests
+from scripts.precompress import upload_resolvers
+from scripts.deploy_index import read_remote_index, save_remote_index
+from scripts.s3_sync import apply_delta, get_s3_client, get_concurrency, list_bucket_parallel
+from scripts.aws_clients import get_client, clear_clients
+from scripts.cloudfront_invalidation import invalidation_paths, batch_paths, create_invalidations
+
+# Set up logging
+logging.basicConfig(level=logging.INFO)
+
+RESULTS_FILE = os.path.join('.benchmarks', 'deploy.jsonl')
+DEFAULT_SIZES = [1000, 10000, 100000]
+# Flag a metric as a regression when it is this much worse than the previous run
+REGRESSION_THRESHOLD = 0.10
+# Share of files rewritten between the first deploy and the delta deploy
+DELTA_SHARE = 0.01
+
+# (extension, share of files, median bytes, spread) approximating a Next.js export
+FILE_MIX = [
+    ('html', 0.25, 8000, 0.8),
+    ('txt', 0.25, 3000, 0.8),
+    ('js', 0.20, 15000, 1.2),
+    ('css', 0.05, 10000, 0.8),
+    ('json', 0.05, 1000, 1.0),
+    ('png', 0.08, 30000, 1.3),
+    ('jpg', 0.08, 50000, 1.3),
+    ('woff2', 0.04, 30000, 0.4),
+]
+
+def generate_site(root, file_count, seed=0):
+    """Write a synthetic static export with realistic sizes and nesting; return total bytes."""
+    rng = random.Random(seed)
+    total_bytes = 0
+    weights = [share for _, share, _, _ in FILE_MIX]
+    for i in range(file_count):
+        ext, _, median, spread = rng.choices(FILE_MIX, weights=weights)[0]
+        size = min(int(rng.lognormvariate(0, spread) * median), 5 * 1024 * 1024)
+        if ext in ('js', 'css', 'woff2'):
+            directory = os.path.join(root, '_next', 'static', f"chunk{i % 50}")
+        else:
+            directory = os.path.join(root, f"section{i % 20}", f"page{i % 500}")
+        os.makedirs(directory, exist_ok=True)
+        with open(os.path.join(directory, f"file{i}.{ext}"), 'wb') as f:
+            f.write(rng.randbytes(size))
+        total_bytes += size
+    return total_bytes
+
+def touch_files(root, keys, seed=1):
+    """Rewrite keys under root with new random bodies of the same size, as an edit-and-rebuild would."""
+    rng = random.Random(seed)
+    for key in keys:
+        path = os.path.join(root, *key.split('/'))
+        size = os.path.getsize(path)
+        with open(path, 'wb') as f:
+            f.write(rng.randbytes(size))
+
+def peak_rss_mb():
+    """Peak resident set size of this process and its finished children, in MB."""
+    self_rss = resource.getrusage(resource.RUSAGE_SELF).ru_maxrss
+    child_rss = resource.getrusage(resource.RUSAGE_CHILDREN).ru_maxrss
+    # ru_maxrss is in kilobytes on Linux and bytes on macOS
+    divisor = 1024 * 1024 if sys.platform == 'darwin' else 1024
+    return max(self_rss, child_rss) / divisor
+
+@contextlib.contextmanager
+def count_api_calls(counter):
+    """Count every botocore API call made while the block runs, by operation name."""
+    from botocore.client import BaseClient
+    original = BaseClient._make_api_call
+
+    def counting_call(client, operation_name, api_params):
+        counter[operation_name] = counter.get(operation_name, 0) + 1
+        return original(client, operation_name, api_params)
+
+    BaseClient._make_api_call = counting_call
+    try:
+        yield counter
+    finally:
+        BaseClient._make_api_call = original
+
+def measure(name, func, file_count, total_bytes):
+    """Run one phase and record wall time, throughput, peak RSS and API calls."""
+    calls = {}
+    with count_api_calls(calls):
+        started = time.perf_counter()
+        func()
+        seconds = time.perf_counter() - started
+    result = {
+        'seconds': round(seconds, 4),
+        'files_per_s': round(file_count / seconds, 1) if seconds else None,
+        'mb_per_s': round(total_bytes / 1024 / 1024 / seconds, 2) if seconds else None,
+        'peak_rss_mb': round(peak_rss_mb(), 1),
+        'api_calls': calls,
+    }
+    logging.info(f"  {name}: {result['seconds']}s, {result['files_per_s']} files/s, {result['mb_per_s']} MB/s, {sum(calls.values())} API calls")
+    return result
+
+@contextlib.contextmanager
+def local_aws(port):
+    """Run a moto server and point boto3 at it through AWS_ENDPOINT_URL."""
+    try:
+        from moto.server import ThreadedMotoServer
+    except ImportError:
+        raise RuntimeError("The benchmark needs moto's server extras: pip install 'moto[server]'")
+    server = ThreadedMotoServer(port=port, verbose=False)
+    server.start()
+    overrides = {
+        'AWS_ENDPOINT_URL': f"http://127.0.0.1:{port}",
+        'AWS_ACCESS_KEY_ID': 'testing',
+        'AWS_SECRET_ACCESS_KEY': 'testing',
+        'AWS_DEFAULT_REGION': 'us-east-1',
+    }
+    saved = {key: os.environ.get(key) for key in list(overrides) + ['AWS_PROFILE']}
+    os.environ.update(overrides)
+    os.environ.pop('AWS_PROFILE', None)
+    # Clients cached before the endpoint override would still talk to AWS
+    clear_clients()
+    try:
+        yield
+    finally:
+        for key, value in saved.items():
+            if value is None:
+                os.environ.pop(key, None)
+            else:
+                os.environ[key] = value
+        clear_clients()
+        server.stop()
+
+COLD_START_SCRIPT = "import sys, time; t = time.perf_counter(); import scripts.main; print(time.perf_counter() - t, 'boto3' in sys.modules)"
+
+def measure_cold_start(runs=5):
+    """Median wall time to start a fresh interpreter and import scripts.main.
+
+    Also records whether boto3 got imported eagerly, which is the main cost
+    that lazy imports keep off the startup path.
+    """
+    wall, imports, boto3_loaded = [], [], False
+    for _ in range(runs):
+        started = time.perf_counter()
+        completed = subprocess.run([sys.executable, '-c', COLD_START_SCRIPT], capture_output=True, text=True)
+        if completed.returncode != 0:
+            logging.warning(f"Could not import scripts.main for the cold start measurement: {completed.stderr.strip().splitlines()[-1:]}")
+            return None
+        wall.append(time.perf_counter() - started)
+        import_seconds, loaded = completed.stdout.split()
+        imports.append(float(import_seconds))
+        boto3_loaded = boto3_loaded or loaded == 'True'
+    result = {
+        'seconds': round(statistics.median(wall), 4),
+        'import_seconds': round(statistics.median(imports), 4),
+        'boto3_imported': boto3_loaded,
+    }
+    logging.info(f"  cold_start: {result['seconds']}s ({result['import_seconds']}s importing scripts.main, boto3 imported: {boto3_loaded})")
+    return result
+
+def create_distribution(cf, bucket_name):
+    """Create a minimal distribution on the stand-in to invalidate against."""
+    response = cf.create_distribution(DistributionConfig={
+        'CallerReference': str(time.time()),
+        'Comment': 'benchmark',
+        'Enabled': True,
+        'Origins': {'Quantity': 1, 'Items': [{
+            'Id': 'bench', 'DomainName': f"{bucket_name}.s3.amazonaws.com",
+            'S3OriginConfig': {'OriginAccessIdentity': ''},
+        }]},
+        'DefaultCacheBehavior': {
+            'TargetOriginId': 'bench', 'ViewerProtocolPolicy': 'allow-all',
+            'ForwardedValues': {'QueryString': False, 'Cookies': {'Forward': 'none'}},
+            'MinTTL': 0,
+        },
+    })
+    return response['Distribution']['Id']
+
+def benchmark_size(file_count, workdir, max_workers=None):
+    """Benchmark every deploy phase for one synthetic site size."""
+    site_dir = os.path.join(workdir, f"out-{file_count}")
+    logging.info(f"Generating {file_count} files in {site_dir}...")
+    total_bytes = generate_site(site_dir, file_count)
+    keys = [os.path.relpath(os.path.join(root, name), site_dir).replace(os.sep, '/')
+            for root, _, names in os.walk(site_dir) for name in names]
+
+    bucket_name = f"bench-{file_count}"
+    s3 = get_s3_client(None, get_concurrency(max_workers))
+    s3.create_bucket(Bucket=bucket_name)
+    cf = get_client('cloudfront', region='us-east-1')
+    distribution_id = create_distribution(cf, bucket_name)
+
+    phases = {}
+    # get_site_hash keeps its stat cache in the working directory: run cold, then warm
+    phases['hash_cold'] = measure('hash_cold', lambda: get_site_hash(site_dir), file_count, total_bytes)
+    phases['hash_warm'] = measure('hash_warm', lambda: get_site_hash(site_dir), file_count, total_bytes)
+
+    # The in-place deploy path: upload a manifest delta, then keep the index in the bucket
+    manifest = annotate_manifest(build_manifest(site_dir))
+
+    def deploy(added, changed, removed):
+        path_for, extra_args_for = upload_resolvers(site_dir, manifest)
+        apply_delta(bucket_name, site_dir, None, added + changed, removed, extra_args_for=extra_args_for, max_workers=max_workers, progress=None, path_for=path_for)
+    phases['s3_upload'] = measure('s3_upload', lambda: deploy(sorted(manifest), [], []), file_count, total_bytes)
+    phases['index_write'] = measure('index_write', lambda: save_remote_index(s3, bucket_name, manifest), file_count, 0)
+    phases['index_read'] = measure('index_read', lambda: read_remote_index(s3, bucket_name), file_count, 0)
+    # The fallback when the index is missing
+    phases['s3_list'] = measure('s3_list', lambda: list_bucket_parallel(s3, bucket_name), file_count, 0)
+
+    old_manifest = manifest
+    edited = keys[::int(1 / DELTA_SHARE)]
+    touch_files(site_dir, edited)
+    manifest = annotate_manifest(build_manifest(site_dir))
+    added, changed, removed = diff_manifests(old_manifest, manifest)
+    delta_bytes = sum(manifest[key]['size'] for key in added + changed)
+    phases['s3_delta'] = measure('s3_delta', lambda: deploy(added, changed, removed), len(added + changed), delta_bytes)
+
+    def invalidate():
+        changed = keys[::10]
+        paths = invalidation_paths([], changed, [], all_keys=keys)
+        for batch in batch_paths(paths):
+            create_invalidations(cf, distribution_id, batch)
+    phases['invalidation'] = measure('invalidation', invalidate, file_count // 10, 0)
+
+    shutil.rmtree(site_dir)
+    return {'files': file_count, 'bytes': total_bytes, 'phases': phases}
+
+def load_previous_runs(results_file):
+    """Load earlier benchmark runs, oldest first."""
+    if not os.path.exists(results_file):
+        return []
+    with open(results_file, 'r') as f:
+        return [json.loads(line) for line in f if line.strip()]
+
+def compare_with_previous(run, previous_runs):
+    """Log per-phase changes against the last run of the same size and return regressions."""
+    regressions = []
+    previous_start = next((earlier['cold_start'] for earlier in reversed(previous_runs) if earlier.get('cold_start')), None)
+    if run.get('cold_start') and previous_start and previous_start['seconds']:
+        change = (run['cold_start']['seconds'] - previous_start['seconds']) / previous_start['seconds']
+        marker = ''
+        if change > REGRESSION_THRESHOLD:
+            marker = '  <-- REGRESSION'
+            regressions.append((0, 'cold_start', change))
+        logging.info(f"{'startup':>13} cold_start    {previous_start['seconds']:>9.3f}s -> {run['cold_start']['seconds']:>9.3f}s ({change:+.1%}){marker}")
+    for size_result in run['sizes']:
+        previous = None
+        for earlier in reversed(previous_runs):
+            previous = next((s for s in earlier['sizes'] if s['files'] == size_result['files']), None)
+            if previous:
+                break
+        if not previous:
+            continue
+        for phase, result in size_result['phases'].items():
+            before = previous['phases'].get(phase)
+            if not before or not before['seconds']:
+                continue
+            change = (result['seconds'] - before['seconds']) / before['seconds']
+            marker = ''
+            if change > REGRESSION_THRESHOLD:
+                marker = '  <-- REGRESSION'
+                regressions.append((size_result['files'], phase, change))
+            logging.info(f"{size_result['files']:>7} files {phase:<13} {before['seconds']:>9.3f}s -> {result['seconds']:>9.3f}s ({change:+.1%}){marker}")
+    return regressions
+
+def main():
+    """Run the deploy benchmark against a local S3/CloudFront stand-in."""
+    parser = argparse.ArgumentParser(description="Benchmark deploy phases against a local moto server.")
+    parser.add_argument('--sizes', type=int, nargs='+', default=DEFAULT_SIZES, help='Synthetic site sizes in files')
+    parser.add_argument('--workers', type=int, help='S3 transfer concurrency (default: S3_SYNC_CONCURRENCY or 16)')
+    parser.add_argument('--port', type=int, default=5055, help='Port for the moto server')
+    parser.add_argument('--results', default=RESULTS_FILE, help='JSON-lines file that accumulates runs')
+    args = parser.parse_args()
+
+    run = {
+        'timestamp': datetime.now(timezone.utc).isoformat(),
+        'python': sys.version.split()[0],
+        'cpus': os.cpu_count(),
+        'sizes': [],
+    }
+    logging.info("Measuring pipeline cold start...")
+    run['cold_start'] = measure_cold_start()
+    workdir = tempfile.mkdtemp(prefix='deploy-bench-')
+    cwd = os.getcwd()
+    try:
+        with local_aws(args.port):
+            os.chdir(workdir)
+            for file_count in args.sizes:
+                run['sizes'].append(benchmark_size(file_count, workdir, args.workers))
+    finally:
+        os.chdir(cwd)
+        shutil.rmtree(workdir, ignore_errors=True)
+
+    previous_runs = load_previous_runs(args.results)
+    regressions = compare_with_previous(run, previous_runs)
+    os.makedirs(os.path.dirname(args.results) or '.', exist_ok=True)
+    with open(args.results, 'a') as f:
+        f.write(json.dumps(run, sort_keys=True) + '\n')
+    logging.info(f"Results appended to {args.results}")
+    if regressions:
+        logging.warning(f"{len(regressions)} phases regressed by more than {REGRESSION_THRESHOLD:.0%}.")
+
+if __name__ == '__main__':
+    main()
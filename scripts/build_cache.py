@@ -0,0 +1,124 @@
+# File: scripts/build_cache.py
+
+import os
+import shutil
+import logging
+import tarfile
+import tempfile
+from scripts.fingerprint import hash_inputs
+
+# Set up logging
+logging.basicConfig(level=logging.INFO)
+
+DEFAULT_CACHE_DIR = os.path.join('~', '.cache', 'website-builder', 'builds')
+DEFAULT_MAX_SIZE_MB = 2048
+
+def get_cache_dir():
+    """Directory holding compressed build snapshots (WEBSITE_BUILD_CACHE_DIR)."""
+    return os.path.expanduser(os.environ.get('WEBSITE_BUILD_CACHE_DIR', DEFAULT_CACHE_DIR))
+
+def get_max_size():
+    """Size cap of the cache in bytes (WEBSITE_BUILD_CACHE_MAX_MB)."""
+    return int(os.environ.get('WEBSITE_BUILD_CACHE_MAX_MB', DEFAULT_MAX_SIZE_MB)) * 1024 * 1024
+
+def build_cache_key(app_dir):
+    """Key a build on the app's sources, config files, package-lock.json and NEXT_PUBLIC_* env."""
+    public_env = sorted(f"{name}={value}" for name, value in os.environ.items() if name.startswith('NEXT_PUBLIC_'))
+    return hash_inputs([app_dir], values=public_env)
+
+def snapshot_path(key):
+    """Path of the snapshot for a cache key."""
+    return os.path.join(get_cache_dir(), f"{key}.tar.gz")
+
+def restore_build(key, out_dir):
+    """Replace out_dir with the cached snapshot for key; return False on a miss."""
+    snapshot = snapshot_path(key)
+    if not os.path.exists(snapshot):
+        return False
+    parent = os.path.dirname(os.path.abspath(out_dir))
+    staging = tempfile.mkdtemp(prefix='.out-restore-', dir=parent)
+    try:
+        with tarfile.open(snapshot, 'r:gz') as tar:
+            if hasattr(tarfile, 'data_filter'):
+                tar.extractall(staging, filter='data')
+            else:
+                tar.extractall(staging)
+        if os.path.exists(out_dir):
+            shutil.rmtree(out_dir)
+        os.replace(os.path.join(staging, 'out'), out_dir)
+    except (OSError, tarfile.TarError) as e:
+        logging.warning(f"Discarding unreadable build snapshot {snapshot}: {str(e)}")
+        os.remove(snapshot)
+        return False
+    finally:
+        shutil.rmtree(staging, ignore_errors=True)
+    # Mark as recently used for LRU eviction
+    os.utime(snapshot)
+    logging.info(f"Restored build output from cache ({key[:12]}).")
+    return True
+
+def store_build(key, out_dir):
+    """Snapshot out_dir into the cache, then evict least recently used entries."""
+    cache_dir = get_cache_dir()
+    os.makedirs(cache_dir, exist_ok=True)
+    fd, tmp_path = tempfile.mkstemp(prefix='.snapshot-', suffix='.tar.gz', dir=cache_dir)
+    os.close(fd)
+    try:
+        with tarfile.open(tmp_path, 'w:gz', compresslevel=6) as tar:
+            tar.add(out_dir, arcname='out')
+        os.replace(tmp_path, snapshot_path(key))
+    except BaseException:
+        os.remove(tmp_path)
+        raise
+    logging.info(f"Stored build output in cache ({key[:12]}, {os.path.getsize(snapshot_path(key))} bytes).")
+    evict(get_max_size(), keep=key)
+
+def evict_lru(cache_dir, max_size, keep=(), label='cache'):
+    """Delete the least recently used files under cache_dir until it fits in max_size.
+
+    Recency is the file's mtime, which readers bump with os.utime on a hit.
+    Paths in keep and in-progress temporary files are never deleted.
+    Returns the number of files removed.
+    """
+    entries = []
+    for root, _, names in os.walk(cache_dir):
+        for name in names:
+            if name.startswith('.') or name.endswith('.tmp'):
+                continue
+            path = os.path.join(root, name)
+            try:
+                stat = os.stat(path)
+            except OSError:
+                continue
+            entries.append((stat.st_mtime, stat.st_size, path))
+    total = sum(size for _, size, _ in entries)
+    removed = freed = 0
+    keep = set(keep)
+    for _, size, path in sorted(entries):
+        if total <= max_size:
+            break
+        if path in keep:
+            continue
+        try:
+            os.remove(path)
+        except OSError:
+            continue
+        total -= size
+        removed += 1
+        freed += size
+    if removed:
+        logging.info(f"Evicted {removed} least recently used files ({freed} bytes) from the {label} cache.")
+    return removed
+
+def evict(max_size, keep=None):
+    """Delete the least recently used snapshots until the cache fits in max_size."""
+    return evict_lru(get_cache_dir(), max_size, keep=[snapshot_path(keep)] if keep else (), label='build')
+
+def cached_build(app_dir, build_func, key=None):
+    """Restore app_dir/out from the cache, or run build_func and cache its output."""
+    key = key or build_cache_key(app_dir)
+    out_dir = os.path.join(app_dir, 'out')
+    if restore_build(key, out_dir):
+        return
+    build_func()
+    store_build(key, out_dir)
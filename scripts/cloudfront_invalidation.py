@@ -0,0 +1,149 @@
+# File: scripts/cloudfront_invalidation.py
+
+import time
+import logging
+
+# Set up logging
+logging.basicConfig(level=logging.INFO)
+
+# CloudFront limits: at most 3000 file paths and 15 wildcard paths may be in progress
+# per distribution at any time, and a single request cannot exceed either limit.
+MAX_PATHS_IN_FLIGHT = 3000
+MAX_WILDCARDS_IN_FLIGHT = 15
+# Beyond this many batches a full '/*' flush is cheaper and faster than queueing
+MAX_BATCHES = 3
+# Collapse a directory into '/dir/*' when at least this share of its files changed
+COLLAPSE_RATIO = 0.5
+# Added files under these prefixes are content-hashed and can never be cached yet
+IMMUTABLE_PREFIXES = ('_next/static/',)
+
+def parent_dirs(key):
+    """Yield every directory prefix of a key, shallowest first ('' is the root)."""
+    parts = key.split('/')[:-1]
+    yield ''
+    for i in range(1, len(parts) + 1):
+        yield '/'.join(parts[:i]) + '/'
+
+def key_to_paths(key):
+    """Return the viewer paths under which CloudFront may have cached a key."""
+    paths = ['/' + key]
+    if key == 'index.html':
+        paths.append('/')
+    elif key.endswith('/index.html'):
+        paths.append('/' + key[:-len('index.html')])
+    return paths
+
+def collapse_keys(changed_keys, all_keys, ratio=COLLAPSE_RATIO):
+    """Split changed keys into wildcard prefixes and keys that stay explicit.
+
+    A directory becomes a single wildcard when it holds at least two changed keys
+    and at least `ratio` of everything under it changed; the shallowest qualifying
+    directory wins so nested wildcards are never emitted.
+    """
+    changed_count = {}
+    total_count = {}
+    for key in all_keys:
+        for prefix in parent_dirs(key):
+            total_count[prefix] = total_count.get(prefix, 0) + 1
+    for key in changed_keys:
+        for prefix in parent_dirs(key):
+            changed_count[prefix] = changed_count.get(prefix, 0) + 1
+
+    wildcards = []
+    for prefix in sorted(changed_count, key=lambda p: (p.count('/'), p)):
+        if any(prefix.startswith(chosen) for chosen in wildcards):
+            continue
+        changed = changed_count[prefix]
+        if changed >= 2 and changed >= ratio * total_count.get(prefix, changed):
+            wildcards.append(prefix)
+
+    explicit = sorted(key for key in changed_keys if not any(key.startswith(prefix) for prefix in wildcards))
+    return wildcards, explicit
+
+def invalidation_paths(added, changed, removed, all_keys=None, ratio=COLLAPSE_RATIO):
+    """Derive the smallest sensible set of invalidation paths from a deploy diff."""
+    keys = set(changed) | set(removed)
+    keys |= {key for key in added if not key.startswith(IMMUTABLE_PREFIXES)}
+    if not keys:
+        return []
+    if all_keys is None:
+        # Without the full key set there is no way to tell what a wildcard would over-invalidate
+        wildcards, explicit = [], sorted(keys)
+    else:
+        wildcards, explicit = collapse_keys(keys, set(all_keys) | keys, ratio)
+    paths = ['/' + prefix + '*' for prefix in wildcards]
+    for key in explicit:
+        paths.extend(key_to_paths(key))
+
+    if len(batch_paths(paths)) > MAX_BATCHES:
+        logging.info(f"{len(paths)} invalidation paths would need more than {MAX_BATCHES} batches; invalidating '/*' instead.")
+        return ['/*']
+    return paths
+
+def batch_paths(paths):
+    """Split paths into batches that fit within a single invalidation request."""
+    batches = []
+    current, wildcards = [], 0
+    for path in paths:
+        is_wildcard = path.endswith('*')
+        if current and (len(current) >= MAX_PATHS_IN_FLIGHT or (is_wildcard and wildcards >= MAX_WILDCARDS_IN_FLIGHT)):
+            batches.append(current)
+            current, wildcards = [], 0
+        current.append(path)
+        wildcards += is_wildcard
+    if current:
+        batches.append(current)
+    return batches
+
+def in_flight_usage(cf, distribution_id):
+    """Count file and wildcard paths of invalidations still in progress."""
+    paths, wildcards = 0, 0
+    paginator = cf.get_paginator('list_invalidations')
+    for page in paginator.paginate(DistributionId=distribution_id):
+        for summary in page['InvalidationList'].get('Items', []):
+            if summary['Status'] != 'InProgress':
+                continue
+            invalidation = cf.get_invalidation(DistributionId=distribution_id, Id=summary['Id'])
+            items = invalidation['Invalidation']['InvalidationBatch']['Paths'].get('Items', [])
+            wildcard_count = sum(1 for item in items if item.endswith('*'))
+            wildcards += wildcard_count
+            paths += len(items) - wildcard_count
+    return paths, wildcards
+
+def wait_for_capacity(cf, distribution_id, batch, poll_interval=15, timeout=1800):
+    """Block until the distribution can accept another batch without hitting its limits."""
+    needed_wildcards = sum(1 for path in batch if path.endswith('*'))
+    needed_paths = len(batch) - needed_wildcards
+    deadline = time.monotonic() + timeout
+    while True:
+        paths, wildcards = in_flight_usage(cf, distribution_id)
+        if paths + needed_paths <= MAX_PATHS_IN_FLIGHT and wildcards + needed_wildcards <= MAX_WILDCARDS_IN_FLIGHT:
+            return
+        if time.monotonic() > deadline:
+            raise TimeoutError(f"Timed out waiting for in-flight invalidations on '{distribution_id}' to finish")
+        logging.info(f"Waiting for in-flight invalidations ({paths} paths, {wildcards} wildcards) to finish...")
+        time.sleep(poll_interval)
+
+def create_invalidations(cf, distribution_id, paths, wait=False):
+    """Submit paths as one or more invalidation batches and return their IDs."""
+    invalidation_ids = []
+    batches = batch_paths(paths)
+    for i, batch in enumerate(batches, start=1):
+        if i > 1 or len(batches) > 1:
+            wait_for_capacity(cf, distribution_id, batch)
+        invalidation = cf.create_invalidation(
+            DistributionId=distribution_id,
+            InvalidationBatch={
+                'Paths': {'Quantity': len(batch), 'Items': batch},
+                'CallerReference': f"{time.time()}-{i}"
+            }
+        )
+        invalidation_id = invalidation['Invalidation']['Id']
+        invalidation_ids.append(invalidation_id)
+        logging.info(f"Invalidation batch {i}/{len(batches)} ({len(batch)} paths) created with ID: {invalidation_id}")
+    if wait:
+        waiter = cf.get_waiter('invalidation_completed')
+        for invalidation_id in invalidation_ids:
+            waiter.wait(DistributionId=distribution_id, Id=invalidation_id)
+        logging.info("Invalidations completed successfully.")
+    return invalidation_ids
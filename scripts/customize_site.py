@@ -4,6 +4,7 @@ import os
 import logging
 import hashlib
 import subprocess
+from scripts.optimize_images import get_image_widths
 
 # Set up logging
 logging.basicConfig(level=logging.INFO, format='%(levelname)s: %(message)s')
@@ -320,19 +321,45 @@ export default config;
         f.write(tailwind_config_content)
     logging.info("tailwind.config.ts updated successfully.")
 
+def create_image_loader(app_dir):
+    """Create the next/image loader that serves the variants written at deploy time."""
+    loader_path = os.path.join(app_dir, 'src', 'image-loader.js')
+    logging.info(f"Creating {loader_path}.")
+
+    loader_content = """// Points next/image at the responsive WebP variants that scripts/optimize_images.py
+// writes next to each JPEG/PNG at deploy time (hero.jpg -> hero-640w.webp).
+export default function imageLoader({ src, width }) {
+  if (process.env.NODE_ENV !== 'production') {
+    return `${src}?w=${width}`;
+  }
+  if (/^[a-z]+:\\/\\//i.test(src) || !/\\.(jpe?g|png)$/i.test(src)) {
+    return src;
+  }
+  return src.replace(/\\.(jpe?g|png)$/i, `-${width}w.webp`);
+}
+"""
+    with open(loader_path, 'w') as f:
+        f.write(loader_content)
+    logging.info("image-loader.js created successfully.")
+
 def update_next_config(app_dir):
     """Update next.config.js with custom configuration."""
     next_config_path = os.path.join(app_dir, 'next.config.js')
     logging.info(f"Updating {next_config_path} with custom configuration.")
 
-    next_config_content = """/** @type {import('next').NextConfig} */
-const nextConfig = {
+    # The loader may only ask for widths the deploy-time image stage produces
+    widths = ', '.join(str(width) for width in get_image_widths())
+    next_config_content = f"""/** @type {{import('next').NextConfig}} */
+const nextConfig = {{
   output: 'export',
   trailingSlash: true,
-  images: {
-    unoptimized: true,
-  },
-}
+  images: {{
+    loader: 'custom',
+    loaderFile: './src/image-loader.js',
+    imageSizes: [],
+    deviceSizes: [{widths}],
+  }},
+}}
 
 module.exports = nextConfig
 """
@@ -357,6 +384,7 @@ def customize_site(domain_name):
     create_services_page(app_dir)
     create_contact_page(app_dir, domain_name)
     update_tailwind_config(app_dir)
+    create_image_loader(app_dir)
     update_next_config(app_dir)
 
     # Commit customization changes
@@ -0,0 +1,104 @@
+# File: scripts/deploy_index.py
+
+import json
+import gzip
+import time
+import random
+import hashlib
+import logging
+from concurrent.futures import ThreadPoolExecutor
+from scripts.precompress import expected_size, expected_md5
+
+# Set up logging
+logging.basicConfig(level=logging.INFO)
+
+# What an in-place deploy left in the bucket, so the next one (from any
+# machine) can diff against it with a single GET instead of listing the bucket
+INDEX_PREFIX = '_deploy/'
+INDEX_KEY = f"{INDEX_PREFIX}index.json.gz"
+INDEX_VERSION = 1
+# Objects HEADed at random to confirm the index still describes the bucket
+DEFAULT_INDEX_PROBES = 8
+
+def index_digest(files):
+    """Checksum of the manifest part of an index, to catch truncated or hand-edited copies."""
+    return hashlib.md5(json.dumps(files, sort_keys=True, separators=(',', ':')).encode()).hexdigest()
+
+def load_remote_index(s3, bucket_name):
+    """Fetch and decode the deploy index, or None if it is missing or damaged."""
+    try:
+        response = s3.get_object(Bucket=bucket_name, Key=INDEX_KEY)
+    except s3.exceptions.NoSuchKey:
+        logging.info(f"No deploy index at 's3://{bucket_name}/{INDEX_KEY}'.")
+        return None
+    try:
+        index = json.loads(gzip.decompress(response['Body'].read()))
+    except (OSError, ValueError) as e:
+        logging.warning(f"Ignoring unreadable deploy index: {e}")
+        return None
+    if index.get('version') != INDEX_VERSION:
+        logging.warning(f"Ignoring deploy index with unsupported version {index.get('version')}")
+        return None
+    if index.get('digest') != index_digest(index.get('files')):
+        logging.warning("Ignoring deploy index whose checksum does not match its contents")
+        return None
+    return index
+
+def probe_index(s3, bucket_name, index, probes=DEFAULT_INDEX_PROBES):
+    """HEAD a random sample of indexed objects; return True if all match the index.
+
+    ETags are compared where they are body MD5s, sizes always (multipart
+    uploads have '<md5>-<parts>' ETags).
+    """
+    keys = random.sample(sorted(index['objects']), min(probes, len(index['objects'])))
+
+    def check(key):
+        expected_bytes, expected_etag = index['objects'][key]
+        try:
+            response = s3.head_object(Bucket=bucket_name, Key=key)
+        except s3.exceptions.ClientError:
+            logging.warning(f"Deploy index lists '{key}', which is missing from the bucket")
+            return False
+        etag = response['ETag'].strip('"')
+        if response['ContentLength'] != expected_bytes or ('-' not in etag and etag != expected_etag):
+            logging.warning(f"Deploy index is out of date for '{key}'")
+            return False
+        return True
+
+    if not keys:
+        return True
+    with ThreadPoolExecutor(max_workers=len(keys)) as executor:
+        return all(list(executor.map(check, keys)))
+
+def read_remote_index(s3, bucket_name, probes=DEFAULT_INDEX_PROBES):
+    """Return the manifest of the last in-place deploy if the index passes its checks, else None."""
+    started = time.monotonic()
+    index = load_remote_index(s3, bucket_name)
+    if index is None or not probe_index(s3, bucket_name, index, probes):
+        return None
+    logging.info(f"Read deploy index of {len(index['files'])} files (deployed {index['deployed_at']}) in {time.monotonic() - started:.2f}s.")
+    return index['files']
+
+def delete_remote_index(s3, bucket_name):
+    """Drop the index before changing objects, so an interrupted deploy forces a full listing."""
+    s3.delete_object(Bucket=bucket_name, Key=INDEX_KEY)
+
+def save_remote_index(s3, bucket_name, manifest):
+    """Write the index for a completed deploy as one gzipped object (a PUT replaces it atomically)."""
+    index = {
+        'version': INDEX_VERSION,
+        'deployed_at': time.strftime('%Y-%m-%dT%H:%M:%SZ', time.gmtime()),
+        'digest': index_digest(manifest),
+        'files': manifest,
+        # Stored size and MD5 of each object body, for probing
+        'objects': {key: [expected_size(entry), expected_md5(entry)] for key, entry in manifest.items()},
+    }
+    body = gzip.compress(json.dumps(index, sort_keys=True, separators=(',', ':')).encode(), compresslevel=9, mtime=0)
+    s3.put_object(
+        Bucket=bucket_name,
+        Key=INDEX_KEY,
+        Body=body,
+        ContentType='application/gzip',
+        CacheControl='no-store'
+    )
+    logging.info(f"Wrote deploy index of {len(manifest)} files ({len(body)} bytes) to 's3://{bucket_name}/{INDEX_KEY}'.")
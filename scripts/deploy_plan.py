@@ -0,0 +1,203 @@
+# File: scripts/deploy_plan.py
+
+import os
+import time
+import random
+import shutil
+import logging
+import tempfile
+import contextlib
+from concurrent.futures import ThreadPoolExecutor
+from scripts.s3_sync import get_s3_client, get_concurrency, list_bucket_parallel
+from scripts.aws_clients import get_client
+from scripts.releases import RELEASES_PREFIX, RELEASE_MANIFESTS_PREFIX, release_prefix, get_live_release, has_releases
+from scripts.cloudfront_invalidation import invalidation_paths
+from scripts.precompress import precompress_manifest, expected_size, expected_md5
+from scripts.site_manifest import build_manifest
+from scripts.deploy_index import INDEX_PREFIX
+from scripts.optimize_site import optimize_site
+from scripts.optimize_images import optimize_images, check_image_loader
+
+# Set up logging
+logging.basicConfig(level=logging.INFO)
+
+# Keys shown per action; the counts always cover everything
+PLAN_SAMPLE = 10
+# Objects HEADed per group of keys that share upload headers
+HEADER_SAMPLE = 3
+
+def matches(entry, remote):
+    """Whether a listed object already holds this manifest entry's body.
+
+    Single-part uploads have the body's MD5 as ETag; multipart ETags ('<md5>-<parts>')
+    are not content hashes, so those fall back to comparing sizes.
+    """
+    if remote['size'] != expected_size(entry):
+        return False
+    return '-' in remote['etag'] or remote['etag'] == expected_md5(entry)
+
+def compare(manifest, remote):
+    """Split keys into (upload, delete, unchanged) by comparing the manifest with a listing."""
+    upload, unchanged = [], []
+    for key, entry in sorted(manifest.items()):
+        if key in remote and matches(entry, remote[key]):
+            unchanged.append(key)
+        else:
+            upload.append(key)
+    delete = sorted(key for key in remote if key not in manifest)
+    return upload, delete, unchanged
+
+def stale_headers(s3, bucket_name, manifest, keys, prefix='', max_workers=None, sample=HEADER_SAMPLE):
+    """Return the keys whose stored Content-Type, Cache-Control or Content-Encoding differ from the manifest.
+
+    A listing only shows bodies, so objects uploaded under older upload rules
+    would otherwise keep their old headers until their content changes.
+    Upload rules set headers by file type, so keys are grouped by extension
+    and expected headers and only `sample` random keys per group are HEADed;
+    a group is HEADed in full only when one of its samples is stale. That
+    costs about `sample` requests per group while the headers are current.
+    """
+    def differs(key):
+        entry = manifest[key]
+        response = s3.head_object(Bucket=bucket_name, Key=prefix + key)
+        return (
+            response.get('ContentType') != entry['content_type']
+            or response.get('CacheControl') != entry['cache_control']
+            or response.get('ContentEncoding') != entry.get('content_encoding')
+        )
+
+    if not keys:
+        return []
+    groups = {}
+    for key in keys:
+        entry = manifest[key]
+        rule = (os.path.splitext(key)[1].lower(), entry['content_type'], entry['cache_control'], entry.get('content_encoding'))
+        groups.setdefault(rule, []).append(key)
+    with ThreadPoolExecutor(max_workers=get_concurrency(max_workers)) as executor:
+        samples = {rule: random.sample(group, min(sample, len(group))) for rule, group in groups.items()}
+        probed = [key for group in samples.values() for key in group]
+        results = dict(zip(probed, executor.map(differs, probed)))
+        suspect = [rule for rule, group in samples.items() if any(results[key] for key in group)]
+        rest = [key for rule in suspect for key in groups[rule] if key not in results]
+        results.update(zip(rest, executor.map(differs, rest)))
+    logging.info(f"Checked headers with {len(results)} HEAD requests for {len(keys)} unchanged objects in {len(groups)} groups ({len(suspect)} groups checked in full).")
+    return sorted(key for key, stale in results.items() if stale)
+
+def listing_delta(s3, bucket_name, manifest, prefix='', check_headers=False):
+    """Diff a manifest against a parallel listing of the objects under prefix.
+
+    With check_headers, a sample of the objects whose body matches is HEADed
+    as well (see stale_headers) and stale ones count as changed. Returns
+    (added, changed, removed, unchanged, remote), with keys relative to prefix.
+    """
+    started = time.monotonic()
+    # The release manifests and the deploy index are never part of the site; releases/
+    # is only skipped when the bucket actually holds releases, since a site may have its own
+    exclude = (RELEASE_MANIFESTS_PREFIX, INDEX_PREFIX)
+    if not prefix and has_releases(s3, bucket_name):
+        exclude += (RELEASES_PREFIX,)
+    listing = list_bucket_parallel(s3, bucket_name, prefix, exclude=exclude)
+    remote = {key[len(prefix):]: obj for key, obj in listing.items()}
+    logging.info(f"Listed {len(remote)} objects under 's3://{bucket_name}/{prefix}' in {time.monotonic() - started:.2f}s.")
+    upload, removed, unchanged = compare(manifest, remote)
+    # Uploads to a key that was not live are additions; the rest change a live object
+    added = [key for key in upload if key not in remote]
+    changed = [key for key in upload if key in remote]
+    if check_headers:
+        stale = stale_headers(s3, bucket_name, manifest, unchanged, prefix)
+        if stale:
+            logging.info(f"{len(stale)} unchanged objects have outdated headers and will be uploaded again.")
+            changed = sorted(changed + stale)
+            stale = set(stale)
+            unchanged = [key for key in unchanged if key not in stale]
+    return added, changed, removed, unchanged, remote
+
+def log_action(label, keys, sizes, sample=PLAN_SAMPLE):
+    """Log the count and bytes of one action, plus a sample of its keys."""
+    logging.info(f"  {label:<10} {len(keys):>7} files {sum(sizes[key] for key in keys):>13} bytes")
+    for key in keys[:sample]:
+        logging.info(f"      {key}")
+    if sample and len(keys) > sample:
+        logging.info(f"      ... and {len(keys) - sample} more")
+
+@contextlib.contextmanager
+def scratch_tree(source_dir):
+    """Yield a hardlinked copy of source_dir that the deploy stages can rewrite.
+
+    The stages replace files instead of writing into them, so the links to
+    source_dir are broken rather than followed. The copy sits next to
+    source_dir because hardlinks cannot cross filesystems.
+    """
+    source_dir = os.path.abspath(source_dir)
+    scratch = tempfile.mkdtemp(prefix='.plan-', dir=os.path.dirname(source_dir))
+    try:
+        tree = os.path.join(scratch, os.path.basename(source_dir))
+        shutil.copytree(source_dir, tree, copy_function=os.link)
+        yield tree
+    finally:
+        shutil.rmtree(scratch, ignore_errors=True)
+
+def plan_deploy(source_dir, s3_bucket_name, distribution_id=None, release=False, precompress=True, minify=True, images=True):
+    """Report what deploying source_dir would upload, delete and invalidate, without writing to AWS.
+
+    The image and minification stages run on a hardlinked scratch copy, so the
+    plan sees the tree the deploy would upload while source_dir stays as
+    built; precompression only fills the local cache. The live objects are
+    listed with parallel ListObjectsV2 calls (the live release prefix when
+    release=True and a release is live, else the bucket root) and compared by
+    ETag. Header-only changes (Content-Type, Cache-Control) do not show up in
+    a listing. Returns {'upload', 'delete', 'unchanged', 'invalidate'}.
+    """
+    started = time.monotonic()
+    if not os.path.exists(source_dir):
+        raise ValueError(f"No built site content found in '{source_dir}'")
+    if images or minify:
+        with scratch_tree(source_dir) as tree:
+            # The scratch copy has no next.config.js beside it, so check against source_dir
+            check_image_loader(source_dir, optimize_images(tree) if images else None)
+            if minify:
+                optimize_site(tree)
+            # No hash cache: its entries are keyed by path and would be replaced by scratch paths
+            manifest = build_manifest(tree, cache_file=None)
+            if precompress:
+                precompress_manifest(tree, manifest)
+    else:
+        check_image_loader(source_dir)
+        manifest = build_manifest(source_dir)
+        if precompress:
+            precompress_manifest(source_dir, manifest)
+    if not manifest:
+        raise ValueError(f"No built site content found in '{source_dir}'")
+
+    s3 = get_s3_client(os.environ.get('AWS_PROFILE'), get_concurrency())
+    live_release = None
+    if release and distribution_id:
+        live_release = get_live_release(get_client('cloudfront', region='us-east-1'), distribution_id)
+    if release and not live_release:
+        # The first release is uploaded in full, whatever the bucket root holds
+        logging.info("No release is live yet; every file would be uploaded.")
+        added, changed, delete, unchanged, remote = sorted(manifest), [], [], [], {}
+    else:
+        prefix = release_prefix(live_release) if live_release else ''
+        added, changed, delete, unchanged, remote = listing_delta(s3, s3_bucket_name, manifest, prefix)
+    upload = sorted(added + changed)
+
+    sizes = {key: expected_size(entry) for key, entry in manifest.items()}
+    sizes.update({key: obj['size'] for key, obj in remote.items() if key not in manifest})
+    if release and not live_release:
+        paths = ['/*']
+    else:
+        paths = invalidation_paths(added, changed, delete, all_keys=set(manifest) | set(remote))
+
+    mode = f"release (diffed against '{live_release}')" if live_release else ('first release' if release else 'in place')
+    logging.info(f"Deploy plan for '{source_dir}' -> s3://{s3_bucket_name}, {mode}:")
+    log_action('upload', upload, sizes)
+    # A new release simply leaves these out; an in-place deploy deletes them
+    log_action('drop' if release else 'delete', delete, sizes)
+    log_action('unchanged', unchanged, sizes, sample=0)
+    if paths:
+        logging.info(f"  invalidate {len(paths):>7} paths: {', '.join(paths[:PLAN_SAMPLE])}{' ...' if len(paths) > PLAN_SAMPLE else ''}")
+    else:
+        logging.info("  invalidate       0 paths")
+    logging.info(f"Plan computed in {time.monotonic() - started:.2f}s; nothing was written to AWS.")
+    return {'upload': upload, 'delete': delete, 'unchanged': unchanged, 'invalidate': paths}
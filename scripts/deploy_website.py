@@ -1,70 +1,101 @@
 # File: scripts/deploy_website.py
 
-import boto3
 import os
 import logging
 import subprocess
-import time
 import json
-from botocore.exceptions import ClientError
-import hashlib
 import traceback
+from scripts.s3_sync import apply_delta, get_s3_client, get_concurrency
+from scripts.releases import new_release_id, release_prefix, get_retention, get_live_release, set_origin_path, load_release_manifest, list_releases, publish_release, prune_releases
+from scripts.cloudfront_invalidation import invalidation_paths, create_invalidations
+from scripts.upload_policy import upload_policy
+from scripts.aws_clients import get_client
+from scripts.optimize_site import optimize_site
+from scripts.optimize_images import optimize_images, check_image_loader, image_stage_enabled
+from scripts.precompress import precompress_manifest, upload_resolvers
+from scripts.site_manifest import build_manifest, manifest_site_hash, diff_manifests
+from scripts.deploy_index import read_remote_index, delete_remote_index, save_remote_index
+from scripts.deploy_plan import listing_delta
 
 # Set up logging
 logging.basicConfig(level=logging.INFO)
 
-def sync_s3_bucket(bucket_name, source_dir):
-    """Sync the built Next.js app to the S3 bucket using AWS CLI."""
-    aws_profile = os.environ.get('AWS_PROFILE')
-    if not aws_profile:
-        raise ValueError("AWS_PROFILE environment variable must be set")
-    logging.info(f"Syncing files from '{source_dir}' to S3 bucket '{bucket_name}' using profile '{aws_profile}'...")
-    subprocess.run(['aws', '--profile', aws_profile, 's3', 'sync', source_dir, f's3://{bucket_name}', '--delete', '--cache-control', 'no-store,max-age=0'], check=True)
-    logging.info(f"Files synced to S3 bucket '{bucket_name}'.")
+def get_cloudfront_client():
+    """Return the shared CloudFront client for the configured AWS profile."""
+    return get_client('cloudfront', region='us-east-1')
 
-def invalidate_cloudfront(distribution_id):
-    """Invalidate the CloudFront distribution to refresh content."""
+def invalidate_cloudfront(distribution_id, paths=None):
+    """Invalidate the given paths (default: everything) on the CloudFront distribution."""
     try:
-        aws_profile = os.environ.get('AWS_PROFILE')
-        if not aws_profile:
-            raise ValueError("AWS_PROFILE environment variable must be set")
-        
-        # Initialize boto3 with explicit configuration
-        session = boto3.Session(profile_name=aws_profile)
-        
-        # Force loading of endpoints data before client creation
-        session._session.get_component('data_loader').load_data('endpoints')
-        
-        from botocore.config import Config
-        config = Config(
-            region_name='us-east-1',
-            retries=dict(
-                max_attempts=3,
-                mode='standard'
-            )
-        )
-        
-        cf = session.client(
-            'cloudfront',
-            config=config,
-            region_name='us-east-1'
-        )
-        
-        caller_reference = str(time.time())
-        logging.info(f"Creating invalidation for CloudFront distribution '{distribution_id}' using profile '{aws_profile}'...")
-        invalidation = cf.create_invalidation(
-            DistributionId=distribution_id,
-            InvalidationBatch={
-                'Paths': {'Quantity': 1, 'Items': ['/*']},
-                'CallerReference': caller_reference
-            }
-        )
-        logging.info(f"Invalidation created with ID: {invalidation['Invalidation']['Id']}")
+        cf = get_cloudfront_client()
+        if paths is None:
+            paths = ['/*']
+        logging.info(f"Creating invalidation for {len(paths)} paths on CloudFront distribution '{distribution_id}'...")
+        return create_invalidations(cf, distribution_id, paths)
     except Exception as e:
         logging.error(f"Failed to create CloudFront invalidation: {str(e)}")
         logging.error(f"Detailed error: {traceback.format_exc()}")
         raise
 
+def release_invalidation_paths(old_manifest, new_manifest):
+    """Invalidation paths for switching between two releases (everything if unknown)."""
+    if old_manifest is None:
+        return ['/*']
+    added, changed, removed = diff_manifests(old_manifest, new_manifest)
+    return invalidation_paths(added, changed, removed, all_keys=set(new_manifest) | set(old_manifest))
+
+def switch_release(cf, distribution_id, release_id, live_manifest, release_manifest):
+    """Make a release live by repointing the origin path, then invalidate what differs."""
+    set_origin_path(cf, distribution_id, '/' + release_prefix(release_id).rstrip('/'))
+    paths = release_invalidation_paths(live_manifest, release_manifest)
+    if paths:
+        invalidate_cloudfront(distribution_id, paths)
+
+def deploy_release(s3_bucket_name, distribution_id, source_dir, new_manifest, new_hash):
+    """Upload the build as an immutable release, switch to it and prune old releases."""
+    s3 = get_s3_client(os.environ.get('AWS_PROFILE'), get_concurrency())
+    cf = get_cloudfront_client()
+    
+    live_release = get_live_release(cf, distribution_id)
+    live_manifest = load_release_manifest(s3, s3_bucket_name, live_release) if live_release else None
+    if live_manifest == new_manifest:
+        logging.info(f"Release '{live_release}' already matches the build. Skipping deployment.")
+        return live_release
+    
+    release_id = new_release_id(new_hash)
+    path_for, extra_args_for = upload_resolvers(source_dir, new_manifest)
+    publish_release(s3, s3_bucket_name, source_dir, release_id, new_manifest, live_release, live_manifest, path_for=path_for, extra_args_for=extra_args_for)
+    switch_release(cf, distribution_id, release_id, live_manifest, new_manifest)
+    if live_release is None:
+        logging.info("Objects previously deployed at the bucket root are no longer served and can be removed.")
+    
+    # Keep the previous release for instant rollback even if retention is 1
+    prune_releases(s3, s3_bucket_name, get_retention(), protected={release_id, live_release})
+    return release_id
+
+def rollback_release(release_id=None):
+    """Point the distribution back at an earlier release (default: the one before live)."""
+    s3_bucket_name, distribution_id = get_terraform_outputs()
+    s3 = get_s3_client(os.environ.get('AWS_PROFILE'), get_concurrency())
+    cf = get_cloudfront_client()
+    
+    live_release = get_live_release(cf, distribution_id)
+    releases = list_releases(s3, s3_bucket_name)
+    if release_id is None:
+        older = [r for r in releases if live_release is None or r < live_release]
+        if not older:
+            raise ValueError("No earlier release available to roll back to.")
+        release_id = older[-1]
+    elif release_id not in releases:
+        raise ValueError(f"Unknown release '{release_id}'. Available: {', '.join(releases)}")
+    
+    logging.info(f"Rolling back from '{live_release}' to '{release_id}'...")
+    live_manifest = load_release_manifest(s3, s3_bucket_name, live_release) if live_release else None
+    release_manifest = load_release_manifest(s3, s3_bucket_name, release_id)
+    switch_release(cf, distribution_id, release_id, live_manifest, release_manifest)
+    logging.info(f"Release '{release_id}' is live.")
+    return release_id
+
 def get_terraform_outputs():
     """Get outputs from Terraform."""
     logging.info("Retrieving Terraform outputs...")
@@ -72,67 +103,92 @@ def get_terraform_outputs():
     outputs = json.loads(output)
     return outputs['s3_bucket_name']['value'], outputs['cloudfront_distribution_id']['value']
 
-def deploy_website():
-    """Deploy the website to AWS."""
-    app_dir = 'next-app'
-    source_dir = os.path.join(app_dir, 'out')
-    hash_file = '.site-hash'
+def sync_s3_delta(bucket_name, source_dir, added, changed, removed, max_workers=None, manifest=None):
+    """Upload only added/changed files and delete only removed ones."""
+    aws_profile = os.environ.get('AWS_PROFILE')
+    path_for, extra_args_for = upload_resolvers(source_dir, manifest or {})
+    logging.info(f"Deploying delta to S3 bucket '{bucket_name}': {len(added)} added, {len(changed)} changed, {len(removed)} removed.")
+    results = apply_delta(bucket_name, source_dir, aws_profile, added + changed, removed, extra_args_for=extra_args_for, max_workers=max_workers, path_for=path_for)
+    logging.info(f"Delta deployed to S3 bucket '{bucket_name}'.")
+    return results
+
+def annotate_manifest(manifest):
+    """Attach the upload policy to each entry so header changes are deployed too."""
+    for path, entry in manifest.items():
+        policy = upload_policy(path)
+        entry['content_type'] = policy['ContentType']
+        entry['cache_control'] = policy['CacheControl']
+    return manifest
+
+def deploy_website(source_dir=os.path.join('next-app', 'out'), release=False, minify=None, images=None, precompress=None):
+    """Deploy the website to AWS, in place or (with release=True) as an atomic release.
+
+    Responsive image variants are written first when images is True, or by
+    default when the app uses the generated image loader (DEPLOY_IMAGES
+    overrides that), and text assets are minified in place unless
+    minify is False (or DEPLOY_MINIFY=false). JS, CSS and wasm bundles are
+    then uploaded gzip-compressed unless precompress is False (or
+    DEPLOY_PRECOMPRESS=false).
+    """
+    if minify is None:
+        minify = os.environ.get('DEPLOY_MINIFY', 'true') != 'false'
+    if images is None:
+        images = image_stage_enabled(source_dir)
+    if precompress is None:
+        precompress = os.environ.get('DEPLOY_PRECOMPRESS', 'true') != 'false'
     
     try:
         s3_bucket_name, distribution_id = get_terraform_outputs()
         
-        # Get new content hash
-        new_hash = get_site_hash(source_dir)
-        if not new_hash:
-            raise ValueError("No built site content found in 'next-app/out'")
+        # Get new per-file manifest
+        if not os.path.exists(source_dir):
+            raise ValueError(f"No built site content found in '{source_dir}'")
+        check_image_loader(source_dir, optimize_images(source_dir) if images else None)
+        if minify:
+            optimize_site(source_dir)
+        new_manifest = annotate_manifest(build_manifest(source_dir))
+        if not new_manifest:
+            raise ValueError(f"No built site content found in '{source_dir}'")
+        if precompress:
+            # The encoding is part of each entry, so switching it redeploys the file
+            precompress_manifest(source_dir, new_manifest)
         
-        # Always deploy if hash file doesn't exist (first deployment)
-        if not os.path.exists(hash_file):
-            logging.info("First deployment detected. Deploying site...")
-            sync_s3_bucket(s3_bucket_name, source_dir)
-            invalidate_cloudfront(distribution_id)
-            
-            # Save new hash
-            with open(hash_file, 'w') as f:
-                f.write(new_hash)
-            
-            # Commit changes to git
-            try:
-                subprocess.run(['git', 'add', hash_file], check=True)
-                subprocess.run(['git', 'commit', '-m', 'update site hash'], check=True)
-                subprocess.run(['git', 'push'], check=True)
-                logging.info("Site hash committed and pushed to repository.")
-            except subprocess.CalledProcessError as e:
-                logging.warning(f"Failed to commit site hash: {str(e)}")
-            
+        if release:
+            deploy_release(s3_bucket_name, distribution_id, source_dir, new_manifest, manifest_site_hash(new_manifest))
             logging.info("Website deployed successfully.")
             return
         
-        # For subsequent deployments, check for changes
-        with open(hash_file, 'r') as f:
-            old_hash = f.read().strip()
-        
-        if old_hash != new_hash:
-            logging.info("Changes detected. Deploying updates...")
-            sync_s3_bucket(s3_bucket_name, source_dir)
-            invalidate_cloudfront(distribution_id)
-            
-            # Update hash
-            with open(hash_file, 'w') as f:
-                f.write(new_hash)
-            
-            # Commit changes to git
-            try:
-                subprocess.run(['git', 'add', hash_file], check=True)
-                subprocess.run(['git', 'commit', '-m', 'update site hash'], check=True)
-                subprocess.run(['git', 'push'], check=True)
-                logging.info("Site hash committed and pushed to repository.")
-            except subprocess.CalledProcessError as e:
-                logging.warning(f"Failed to commit site hash: {str(e)}")
-            
-            logging.info("Website deployed successfully.")
+        # The index in the bucket describes what is live, whichever machine deployed it
+        s3 = get_s3_client(os.environ.get('AWS_PROFILE'), get_concurrency())
+        old_manifest = read_remote_index(s3, s3_bucket_name)
+        if old_manifest is not None:
+            added, changed, removed = diff_manifests(old_manifest, new_manifest)
+            all_keys = set(new_manifest) | set(old_manifest)
         else:
+            # First deployment, or an index that is missing or out of date: diff by ETag
+            # against a full listing instead, and HEAD the matching objects since
+            # headers from older upload rules are invisible in a listing
+            logging.info("No usable deploy index. Listing the bucket to compute the delta...")
+            added, changed, removed, _, remote = listing_delta(s3, s3_bucket_name, new_manifest, check_headers=True)
+            all_keys = set(new_manifest) | set(remote)
+        if not (added or changed or removed):
+            if old_manifest is None:
+                save_remote_index(s3, s3_bucket_name, new_manifest)
             logging.info("No changes detected in the site content. Skipping deployment.")
+            return
+        
+        logging.info("Changes detected. Deploying updates...")
+        # A deploy that dies half-way must not leave an index that claims it finished
+        delete_remote_index(s3, s3_bucket_name)
+        sync_s3_delta(s3_bucket_name, source_dir, added, changed, removed, manifest=new_manifest)
+        paths = invalidation_paths(added, changed, removed, all_keys=all_keys)
+        if paths:
+            invalidate_cloudfront(distribution_id, paths)
+        else:
+            logging.info("No cached paths affected. Skipping CloudFront invalidation.")
+        save_remote_index(s3, s3_bucket_name, new_manifest)
+        
+        logging.info("Website deployed successfully.")
     except Exception as e:
         logging.error(f"Deployment failed: {str(e)}")
         raise
@@ -141,19 +197,28 @@ def get_site_hash(directory):
     """Calculate hash of the site contents."""
     if not os.path.exists(directory):
         return None
-        
-    file_hashes = {}
-    for root, _, files in os.walk(directory):
-        for file in files:
-            file_path = os.path.join(root, file)
-            with open(file_path, 'rb') as f:
-                file_hash = hashlib.md5(f.read()).hexdigest()
-            rel_path = os.path.relpath(file_path, directory)
-            file_hashes[rel_path] = file_hash
-    
-    # Create a deterministic string from the dictionary
-    content_str = json.dumps(file_hashes, sort_keys=True)
-    return hashlib.md5(content_str.encode()).hexdigest()
+    return manifest_site_hash(build_manifest(directory))
 
 if __name__ == '__main__':
-    deploy_website()
+    import argparse
+    parser = argparse.ArgumentParser(description="Deploy a built static site to S3 and CloudFront.")
+    parser.add_argument('--source-dir', default=os.path.join('next-app', 'out'), help='Directory containing the built site')
+    parser.add_argument('--release', action='store_true', help='Upload as an immutable release and switch the CloudFront origin path to it')
+    parser.add_argument('--no-minify', action='store_true', help='Upload HTML, RSC, JSON and SVG files exactly as built')
+    parser.add_argument('--no-images', action='store_true', help='Skip writing responsive WebP/AVIF image variants')
+    parser.add_argument('--no-precompress', action='store_true', help='Upload JS, CSS and wasm bundles uncompressed and leave compression to CloudFront')
+    parser.add_argument('--plan', action='store_true', help='Only list the bucket and print what a deploy would upload, delete and invalidate')
+    parser.add_argument('--rollback', nargs='?', const='', metavar='RELEASE_ID', help='Switch back to RELEASE_ID (default: the release before the live one)')
+    args = parser.parse_args()
+    release = args.release or os.environ.get('DEPLOY_RELEASES') == 'true'
+    if args.rollback is not None:
+        rollback_release(args.rollback or None)
+    elif args.plan:
+        from scripts.deploy_plan import plan_deploy
+        s3_bucket_name, distribution_id = get_terraform_outputs()
+        precompress = not args.no_precompress and os.environ.get('DEPLOY_PRECOMPRESS', 'true') != 'false'
+        minify = not args.no_minify and os.environ.get('DEPLOY_MINIFY', 'true') != 'false'
+        images = not args.no_images and image_stage_enabled(args.source_dir)
+        plan_deploy(args.source_dir, s3_bucket_name, distribution_id, release=release, precompress=precompress, minify=minify, images=images)
+    else:
+        deploy_website(args.source_dir, release=release, minify=False if args.no_minify else None, images=False if args.no_images else None, precompress=False if args.no_precompress else None)
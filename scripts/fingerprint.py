@@ -0,0 +1,80 @@
+# File: scripts/fingerprint.py
+
+import os
+import json
+import hashlib
+import logging
+
+# Set up logging
+logging.basicConfig(level=logging.INFO)
+
+FINGERPRINT_FILE = '.stage-fingerprints.json'
+# Generated or vendored directories that never count as stage inputs
+IGNORED_DIRS = {'node_modules', '.next', 'out', '.git', '.terraform', 'target', 'dist'}
+
+_force = os.environ.get('FORCE_STAGES') == 'true'
+
+def set_force(force):
+    """Make every stage run regardless of its fingerprint (the --force flag)."""
+    global _force
+    _force = force
+
+def iter_files(paths, ignored_dirs=IGNORED_DIRS):
+    """Yield every file under paths (files or directories) in a stable order."""
+    for path in sorted(paths):
+        if os.path.isfile(path):
+            yield path
+        elif os.path.isdir(path):
+            for root, dirs, files in os.walk(path):
+                dirs[:] = sorted(d for d in dirs if d not in ignored_dirs)
+                for name in sorted(files):
+                    yield os.path.join(root, name)
+
+def hash_inputs(paths=(), values=(), ignored_dirs=IGNORED_DIRS):
+    """SHA-256 over the names and contents of input files plus literal values."""
+    digest = hashlib.sha256()
+    for value in values:
+        digest.update(f"value:{value}\0".encode())
+    for file_path in iter_files(paths, ignored_dirs):
+        digest.update(f"file:{file_path.replace(os.sep, '/')}\0".encode())
+        with open(file_path, 'rb') as f:
+            for chunk in iter(lambda: f.read(1024 * 1024), b''):
+                digest.update(chunk)
+    return digest.hexdigest()
+
+def load_fingerprints(fingerprint_file=FINGERPRINT_FILE):
+    """Load the fingerprints recorded by the last successful run of each stage."""
+    if not os.path.exists(fingerprint_file):
+        return {}
+    try:
+        with open(fingerprint_file, 'r') as f:
+            return json.load(f)
+    except (OSError, ValueError):
+        return {}
+
+def is_fresh(stage, fingerprint, fingerprint_file=FINGERPRINT_FILE):
+    """True if the stage last succeeded with the same fingerprint and --force is off."""
+    if _force:
+        return False
+    return load_fingerprints(fingerprint_file).get(stage) == fingerprint
+
+def record(stage, fingerprint, fingerprint_file=FINGERPRINT_FILE):
+    """Remember the fingerprint of a stage that just completed successfully."""
+    fingerprints = load_fingerprints(fingerprint_file)
+    fingerprints[stage] = fingerprint
+    tmp_file = f"{fingerprint_file}.tmp"
+    with open(tmp_file, 'w') as f:
+        json.dump(fingerprints, f, indent=2, sort_keys=True)
+    os.replace(tmp_file, fingerprint_file)
+
+def run_stage(stage, fingerprint, func, args=(), outputs=()):
+    """Run func(*args) unless the stage is fresh and all its outputs still exist.
+
+    The fingerprint is recorded only after func returns successfully.
+    """
+    if is_fresh(stage, fingerprint) and all(os.path.exists(path) for path in outputs):
+        logging.info(f"Inputs of stage '{stage}' are unchanged since the last successful run. Skipping (use --force to re-run).")
+        return False
+    func(*args)
+    record(stage, fingerprint)
+    return True
@@ -0,0 +1,130 @@
+# File: scripts/fleet.py
+
+import os
+import sys
+import json
+import time
+import logging
+import argparse
+import traceback
+from concurrent.futures import ProcessPoolExecutor, as_completed
+
+# Set up logging
+logging.basicConfig(level=logging.INFO)
+
+DEFAULT_FLEET_FILE = 'sites.json'
+DEFAULT_FLEET_WORKERS = 4
+
+def load_fleet(fleet_file):
+    """Load the site list from a JSON manifest.
+
+    Each site needs a `path` to its repository checkout; `name`, `source_dir`,
+    `release` and `build` are optional:
+
+        {"sites": [{"name": "example_com", "path": "~/git/websites/example_com", "release": true}]}
+    """
+    with open(fleet_file, 'r') as f:
+        data = json.load(f)
+    sites = data['sites'] if isinstance(data, dict) else data
+    for site in sites:
+        if 'path' not in site:
+            raise ValueError(f"Site entry without a 'path' in {fleet_file}: {site}")
+        site['path'] = os.path.abspath(os.path.expanduser(site['path']))
+        site.setdefault('name', os.path.basename(site['path']))
+    names = [site['name'] for site in sites]
+    duplicates = sorted({name for name in names if names.count(name) > 1})
+    if duplicates:
+        raise ValueError(f"Duplicate site names in {fleet_file}: {', '.join(duplicates)}")
+    return sites
+
+def get_fleet_workers(max_workers=None):
+    """Number of sites handled at once, from the argument or FLEET_CONCURRENCY."""
+    if max_workers:
+        return max_workers
+    return int(os.environ.get('FLEET_CONCURRENCY', DEFAULT_FLEET_WORKERS))
+
+def deploy_site(site):
+    """Build and deploy one site inside its own checkout; never raises.
+
+    Runs in a worker process, which keeps its AWS clients and Node.js setup
+    for the next site it handles; the build, npm and hash caches on disk are
+    shared by every worker.
+    """
+    from scripts.setup_site import build_site
+    from scripts.deploy_website import deploy_website
+
+    for handler in logging.getLogger().handlers:
+        handler.setFormatter(logging.Formatter(f"%(levelname)s:{site['name']}:%(message)s"))
+    result = {'name': site['name'], 'status': 'ok', 'build_s': None, 'deploy_s': None, 'error': None}
+    started = time.perf_counter()
+    try:
+        os.chdir(site['path'])
+        if site.get('build', True):
+            build_started = time.perf_counter()
+            build_site()
+            result['build_s'] = time.perf_counter() - build_started
+        deploy_started = time.perf_counter()
+        deploy_website(site.get('source_dir', os.path.join('next-app', 'out')), release=site.get('release', False))
+        result['deploy_s'] = time.perf_counter() - deploy_started
+    except (Exception, SystemExit) as e:
+        result['status'] = 'failed'
+        result['error'] = f"{type(e).__name__}: {e}"
+        logging.debug(traceback.format_exc())
+    result['total_s'] = time.perf_counter() - started
+    return result
+
+def format_seconds(seconds):
+    """Render a duration for the summary table."""
+    return '-' if seconds is None else f"{seconds:.1f}s"
+
+def log_summary(results):
+    """Log a per-site table of outcomes and durations."""
+    width = max([len(result['name']) for result in results] + [4])
+    logging.info(f"{'site':<{width}}  {'status':<7} {'build':>8} {'deploy':>8} {'total':>8}  error")
+    for result in sorted(results, key=lambda result: result['name']):
+        logging.info(
+            f"{result['name']:<{width}}  {result['status']:<7} {format_seconds(result['build_s']):>8} "
+            f"{format_seconds(result['deploy_s']):>8} {format_seconds(result['total_s']):>8}  {result['error'] or ''}"
+        )
+
+def deploy_fleet(sites, max_workers=None):
+    """Deploy every site on a bounded process pool and return one result per site."""
+    max_workers = min(get_fleet_workers(max_workers), len(sites)) or 1
+    logging.info(f"Deploying {len(sites)} sites with {max_workers} workers...")
+    results = []
+    with ProcessPoolExecutor(max_workers=max_workers) as executor:
+        futures = {executor.submit(deploy_site, site): site for site in sites}
+        for future in as_completed(futures):
+            site = futures[future]
+            try:
+                result = future.result()
+            except Exception as e:
+                # The worker process itself died
+                result = {'name': site['name'], 'status': 'failed', 'build_s': None, 'deploy_s': None, 'total_s': None, 'error': f"{type(e).__name__}: {e}"}
+            results.append(result)
+            logging.info(f"[{len(results)}/{len(sites)}] {result['name']}: {result['status']}")
+    log_summary(results)
+    return results
+
+def main():
+    """Build and deploy every site listed in a fleet manifest."""
+    parser = argparse.ArgumentParser(description="Build and deploy many sites built from this template.")
+    parser.add_argument('fleet_file', nargs='?', default=DEFAULT_FLEET_FILE, help='JSON manifest listing the sites')
+    parser.add_argument('--workers', type=int, help='Sites deployed at once (default: FLEET_CONCURRENCY or 4)')
+    parser.add_argument('--only', nargs='+', metavar='NAME', help='Deploy only the named sites')
+    args = parser.parse_args()
+
+    sites = load_fleet(args.fleet_file)
+    if args.only:
+        sites = [site for site in sites if site['name'] in args.only]
+    if not sites:
+        logging.info("No sites to deploy.")
+        return
+    results = deploy_fleet(sites, args.workers)
+    failed = [result['name'] for result in results if result['status'] != 'ok']
+    if failed:
+        logging.error(f"{len(failed)} of {len(results)} sites failed: {', '.join(sorted(failed))}")
+        sys.exit(1)
+
+if __name__ == '__main__':
+    main()
@@ -1,38 +1,136 @@
 # File: scripts/install_requirements.py
 
+import os
+import re
 import sys
+import json
 import subprocess
 import shutil
 import logging
+from importlib import metadata
 
 # Set up logging
 logging.basicConfig(level=logging.INFO)
 
+REQUIRED_PACKAGES = [
+    'boto3>=1.34.0',  # Latest stable version with CloudFront support
+    'botocore>=1.34.0',
+    'requests',
+    'python-dotenv',
+    'Pillow>=11.2',  # AVIF encoding built in
+]
+TOOL_CACHE_FILE = os.path.join('~', '.cache', 'website-builder', 'tools.json')
+# Version commands of the external tools the pipeline shells out to
+TOOL_VERSION_COMMANDS = {
+    'aws': ['aws', '--version'],
+    'terraform': ['terraform', '-version'],
+    'node': ['node', '--version'],
+    'npm': ['npm', '--version'],
+}
+
+def version_tuple(version):
+    """Numeric release components of a version string, for >= comparisons."""
+    parts = []
+    for part in version.split('.'):
+        match = re.match(r'\d+', part)
+        if not match:
+            break
+        parts.append(int(match.group()))
+    return tuple(parts)
+
+def missing_packages(requirements=REQUIRED_PACKAGES):
+    """Return the requirements that are not installed at a sufficient version.
+
+    Installed versions are read from package metadata, so no pip process is
+    started when everything is already satisfied.
+    """
+    missing = []
+    for requirement in requirements:
+        name, _, minimum = (part.strip() for part in requirement.partition('>='))
+        try:
+            installed = metadata.version(name)
+        except metadata.PackageNotFoundError:
+            missing.append(requirement)
+            continue
+        if minimum and version_tuple(installed) < version_tuple(minimum):
+            missing.append(requirement)
+    return missing
+
 def install_python_packages():
-    """Install required Python packages using pip."""
-    required_packages = [
-        'boto3>=1.34.0',  # Latest stable version with CloudFront support
-        'botocore>=1.34.0',
-        'requests',
-        'python-dotenv'
-    ]
-    for package in required_packages:
-        subprocess.check_call([sys.executable, '-m', 'pip', 'install', package])
-
-def check_and_install_aws_cli():
+    """Install required Python packages that are missing, in a single pip call."""
+    missing = missing_packages()
+    if not missing:
+        logging.info("Required Python packages are already installed.")
+        return
+    logging.info(f"Installing Python packages: {', '.join(missing)}")
+    subprocess.check_call([sys.executable, '-m', 'pip', 'install', *missing])
+
+def load_tool_cache(cache_file=TOOL_CACHE_FILE):
+    """Load the tool versions recorded by earlier probes."""
+    try:
+        with open(os.path.expanduser(cache_file), 'r') as f:
+            return json.load(f)
+    except (OSError, ValueError):
+        return {}
+
+def save_tool_cache(cache, cache_file=TOOL_CACHE_FILE):
+    """Persist probed tool versions."""
+    cache_file = os.path.expanduser(cache_file)
+    os.makedirs(os.path.dirname(cache_file), exist_ok=True)
+    tmp_file = f"{cache_file}.{os.getpid()}.tmp"
+    with open(tmp_file, 'w') as f:
+        json.dump(cache, f, indent=2, sort_keys=True)
+    os.replace(tmp_file, cache_file)
+
+def probe_tool(name, cache):
+    """Return the version of a tool on PATH, or None if it is not installed.
+
+    The version command only runs when the resolved binary is new or has
+    changed since it was last probed.
+    """
+    path = shutil.which(name)
+    if not path:
+        cache.pop(name, None)
+        return None
+    real_path = os.path.realpath(path)
+    stat = os.stat(real_path)
+    stamp = [real_path, stat.st_size, stat.st_mtime_ns]
+    entry = cache.get(name)
+    if entry and entry.get('stamp') == stamp:
+        return entry['version']
+    try:
+        output = subprocess.run(TOOL_VERSION_COMMANDS[name], capture_output=True, text=True, check=True,
+                                env=dict(os.environ, CHECKPOINT_DISABLE='1')).stdout
+        version = (output.strip().splitlines() or ['unknown'])[0]
+    except (OSError, subprocess.CalledProcessError):
+        return None
+    cache[name] = {'stamp': stamp, 'version': version}
+    return version
+
+def probe_tools(names=TOOL_VERSION_COMMANDS):
+    """Probe every tool and return {name: version or None}."""
+    cache = load_tool_cache()
+    versions = {name: probe_tool(name, cache) for name in names}
+    try:
+        save_tool_cache(cache)
+    except OSError as e:
+        logging.warning(f"Could not save tool version cache: {str(e)}")
+    return versions
+
+def check_and_install_aws_cli(version=None):
     """Check if AWS CLI is installed; if not, install it."""
-    if not shutil.which('aws'):
+    if not version:
         logging.info("AWS CLI not found. Installing AWS CLI...")
         # Install AWS CLI v2
         subprocess.check_call(['curl', 'https://awscli.amazonaws.com/awscli-exe-linux-x86_64.zip', '-o', 'awscliv2.zip'])
         subprocess.check_call(['unzip', 'awscliv2.zip'])
         subprocess.check_call(['sudo', './aws/install'])
     else:
-        logging.info("AWS CLI is already installed.")
+        logging.info(f"AWS CLI is already installed ({version}).")
 
-def check_and_install_terraform():
+def check_and_install_terraform(version=None):
     """Check if Terraform is installed; if not, install it."""
-    if not shutil.which('terraform'):
+    if not version:
         logging.info("Terraform not found. Installing Terraform...")
         # Install Terraform
         terraform_version = '1.5.7'
@@ -40,24 +138,25 @@ def check_and_install_terraform():
         subprocess.check_call(['unzip', 'terraform.zip'])
         subprocess.check_call(['sudo', 'mv', 'terraform', '/usr/local/bin/'])
     else:
-        logging.info("Terraform is already installed.")
+        logging.info(f"Terraform is already installed ({version}).")
 
-def check_and_install_node():
+def check_and_install_node(node_version=None, npm_version=None):
     """Check if Node.js and npm are installed; if not, install them."""
-    if not shutil.which('node') or not shutil.which('npm'):
+    if not node_version or not npm_version:
         logging.info("Node.js or npm not found. Installing Node.js and npm...")
         # Install Node.js (LTS version)
         subprocess.check_call(['curl', '-fsSL', 'https://deb.nodesource.com/setup_lts.x', '|', 'sudo', '-E', 'bash', '-'])
         subprocess.check_call(['sudo', 'apt-get', 'install', '-y', 'nodejs'])
     else:
-        logging.info("Node.js and npm are already installed.")
+        logging.info(f"Node.js {node_version} and npm {npm_version} are already installed.")
 
 def install_requirements():
     """Install all required tools and packages."""
     install_python_packages()
-    check_and_install_aws_cli()
-    check_and_install_terraform()
-    check_and_install_node()
+    versions = probe_tools()
+    check_and_install_aws_cli(versions['aws'])
+    check_and_install_terraform(versions['terraform'])
+    check_and_install_node(versions['node'], versions['npm'])
     logging.info("All requirements are installed.")
 
 if __name__ == '__main__':
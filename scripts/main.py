@@ -4,64 +4,96 @@
 import os
 import logging
 import sys
-from botocore.exceptions import ProfileNotFound, NoCredentialsError, ClientError
-from scripts.setup_aws import setup_aws
+import argparse
+from scripts.setup_aws import setup_aws, finish_delegation
 from scripts.setup_site import setup_site
 from scripts.setup_terraform import setup_terraform
 from scripts.deploy_website import deploy_website
 from scripts.install_requirements import install_requirements
+from scripts.fingerprint import set_force
+from scripts.tracing import span, install_subprocess_hooks, write_trace, log_summary, profiled
 
 # Set up logging
 logging.basicConfig(level=logging.INFO)
 
-def main():
-    try:
-        # Install required dependencies
+def parse_args(argv=None):
+    """Parse pipeline command-line options."""
+    parser = argparse.ArgumentParser(description="Provision, build and deploy the website.")
+    parser.add_argument('--trace', metavar='PATH', default=os.getenv('PIPELINE_TRACE'), help='Write a Chrome-trace JSON timeline of every phase and subprocess to PATH')
+    parser.add_argument('--profile', metavar='PATH', default=os.getenv('PIPELINE_PROFILE'), help='Run the Python-side phases under cProfile and dump the stats to PATH')
+    parser.add_argument('--background-delegation', action='store_true', default=os.getenv('NAMESERVER_UPDATE_BACKGROUND') == 'true', help='Continue with the pipeline while the registered nameservers are updated in the background')
+    parser.add_argument('--force', action='store_true', help='Run every stage even if its inputs are unchanged since the last successful run')
+    return parser.parse_args(argv)
+
+def run_pipeline(background_delegation=False):
+    """Run every setup and deployment phase in order."""
+    # Install required dependencies
+    with span('install_requirements'):
         install_requirements()
 
-        domain_name = os.getenv('DOMAIN_NAME')
-        repo_name = os.getenv('REPO_NAME')
-        if not domain_name or not repo_name:
-            raise ValueError("DOMAIN_NAME and REPO_NAME environment variables must be set.")
-        logging.info(f"Using domain name: {domain_name}")
-        logging.info(f"Using repository name: {repo_name}")
+    domain_name = os.getenv('DOMAIN_NAME')
+    repo_name = os.getenv('REPO_NAME')
+    if not domain_name or not repo_name:
+        raise ValueError("DOMAIN_NAME and REPO_NAME environment variables must be set.")
+    logging.info(f"Using domain name: {domain_name}")
+    logging.info(f"Using repository name: {repo_name}")
 
-        try:
-            hosted_zone_id = setup_aws(domain_name)
-        except Exception as e:
-            logging.error(f"AWS setup failed: {str(e)}")
-            logging.error("Please ensure your AWS credentials are correctly configured.")
-            logging.error("You can set them using environment variables AWS_ACCESS_KEY_ID and AWS_SECRET_ACCESS_KEY,")
-            logging.error("or by running 'aws configure' to set up your AWS CLI profile.")
-            logging.error(f"Current AWS profile: {os.environ.get('AWS_PROFILE', 'Not set')}")
-            logging.error(f"Current AWS region: {os.environ.get('AWS_DEFAULT_REGION', 'Not set')}")
-            raise
+    try:
+        with span('setup_aws', domain_name=domain_name):
+            hosted_zone_id = setup_aws(domain_name, background_delegation)
+    except Exception as e:
+        logging.error(f"AWS setup failed: {str(e)}")
+        logging.error("Please ensure your AWS credentials are correctly configured.")
+        logging.error("You can set them using environment variables AWS_ACCESS_KEY_ID and AWS_SECRET_ACCESS_KEY,")
+        logging.error("or by running 'aws configure' to set up your AWS CLI profile.")
+        logging.error(f"Current AWS profile: {os.environ.get('AWS_PROFILE', 'Not set')}")
+        logging.error(f"Current AWS region: {os.environ.get('AWS_DEFAULT_REGION', 'Not set')}")
+        raise
 
-        # Set up Terraform and provision AWS infrastructure
-        try:
+    # Set up Terraform and provision AWS infrastructure
+    try:
+        with span('setup_terraform'):
             setup_terraform(domain_name, repo_name, hosted_zone_id)
-        except Exception as e:
-            logging.error(f"Failed to set up Terraform: {str(e)}")
-            raise
+    except Exception as e:
+        logging.error(f"Failed to set up Terraform: {str(e)}")
+        raise
 
-        # Set up and customize the Next.js site, or rebuild if it exists
-        try:
+    # Set up and customize the Next.js site, or rebuild if it exists
+    try:
+        with span('setup_site'):
             setup_site(domain_name)
-        except Exception as e:
-            logging.error(f"Failed to set up or rebuild site: {str(e)}")
-            raise
+    except Exception as e:
+        logging.error(f"Failed to set up or rebuild site: {str(e)}")
+        raise
 
-        # Deploy the website
-        try:
+    # Deploy the website
+    try:
+        with span('deploy_website'):
             deploy_website()
-        except Exception as e:
-            logging.error(f"Failed to deploy website: {str(e)}")
-            raise
+    except Exception as e:
+        logging.error(f"Failed to deploy website: {str(e)}")
+        raise
 
+    # Report the outcome of a nameserver update left running in the background
+    with span('finish_delegation'):
+        finish_delegation()
+
+def main(argv=None):
+    args = parse_args(argv)
+    if args.force:
+        set_force(True)
+    install_subprocess_hooks()
+    try:
+        with profiled(args.profile), span('pipeline'):
+            run_pipeline(args.background_delegation)
         logging.info("Website setup and deployment completed successfully!")
     except Exception as e:
         logging.error(f"An error occurred during setup: {str(e)}")
         raise
+    finally:
+        log_summary()
+        if args.trace:
+            write_trace(args.trace)
 
 if __name__ == "__main__":
     main()
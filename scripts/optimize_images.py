@@ -0,0 +1,305 @@
+# File: scripts/optimize_images.py
+
+import os
+import json
+import shutil
+import filecmp
+import hashlib
+import logging
+from scripts.build_cache import evict_lru
+
+# Set up logging
+logging.basicConfig(level=logging.INFO)
+
+DEFAULT_CACHE_DIR = os.path.join('~', '.cache', 'website-builder', 'images')
+DEFAULT_MAX_SIZE_MB = 2048
+# Bump when encoding changes so cached variants are not reused
+IMAGE_PIPELINE_VERSION = 1
+# Widths Next.js asks the image loader for (imageSizes + deviceSizes in next.config.js)
+DEFAULT_IMAGE_WIDTHS = (256, 640, 1080, 1920)
+# WebP is always produced: the generated image loader points next/image at it
+DEFAULT_IMAGE_FORMATS = ('avif', 'webp')
+SOURCE_TYPES = {'jpg': 'jpeg', 'jpeg': 'jpeg', 'png': 'png'}
+MIME_TYPES = {'avif': 'image/avif', 'webp': 'image/webp', 'jpeg': 'image/jpeg', 'png': 'image/png'}
+SAVE_OPTIONS = {
+    'avif': {'quality': 50},
+    'webp': {'quality': 75, 'method': 4},
+    'jpeg': {'quality': 80, 'optimize': True, 'progressive': True},
+    'png': {'optimize': True},
+}
+MANIFEST_NAME = 'image-manifest.json'
+# Written by scripts/customize_site.py; rewrites every JPEG/PNG URL to <name>-<width>w.webp
+LOADER_FILE = 'image-loader.js'
+NEXT_CONFIG_FILES = ('next.config.js', 'next.config.mjs', 'next.config.ts')
+# Below this many images, process start-up costs more than it saves
+PARALLEL_IMAGE_THRESHOLD = 4
+# EXIF orientations that swap width and height
+TRANSPOSED_ORIENTATIONS = {5, 6, 7, 8}
+
+def get_cache_dir():
+    """Directory holding encoded variants keyed by source hash (WEBSITE_IMAGE_CACHE_DIR)."""
+    return os.path.expanduser(os.environ.get('WEBSITE_IMAGE_CACHE_DIR', DEFAULT_CACHE_DIR))
+
+def get_max_size():
+    """Size cap of the cache in bytes (WEBSITE_IMAGE_CACHE_MAX_MB)."""
+    return int(os.environ.get('WEBSITE_IMAGE_CACHE_MAX_MB', DEFAULT_MAX_SIZE_MB)) * 1024 * 1024
+
+def get_image_widths():
+    """Responsive widths, from IMAGE_WIDTHS (comma-separated) or the defaults."""
+    value = os.environ.get('IMAGE_WIDTHS')
+    if not value:
+        return DEFAULT_IMAGE_WIDTHS
+    return tuple(sorted({int(width) for width in value.split(',') if width.strip()}))
+
+def get_image_formats():
+    """Modern encodings to produce, from IMAGE_FORMATS (comma-separated) or the defaults."""
+    value = os.environ.get('IMAGE_FORMATS')
+    formats = [fmt.strip().lower() for fmt in value.split(',')] if value else list(DEFAULT_IMAGE_FORMATS)
+    if 'webp' not in formats:
+        formats.append('webp')
+    return tuple(fmt for fmt in formats if fmt in ('avif', 'webp'))
+
+def load_pillow():
+    """Import Pillow, raising a RuntimeError that explains how to install it."""
+    try:
+        from PIL import Image
+    except ImportError:
+        raise RuntimeError("Image optimization needs Pillow: pip install Pillow (or set DEPLOY_IMAGES=false)")
+    try:
+        # Registers AVIF support on Pillow releases without it built in
+        import pillow_avif  # noqa: F401
+    except ImportError:
+        pass
+    Image.init()
+    return Image
+
+def supported_formats(formats):
+    """Drop encodings this Pillow build cannot write."""
+    Image = load_pillow()
+    available = set(Image.registered_extensions().values())
+    supported = tuple(fmt for fmt in formats if fmt.upper() in available)
+    for fmt in formats:
+        if fmt not in supported:
+            logging.warning(f"Pillow cannot encode {fmt.upper()} here; skipping {fmt} variants.")
+    return supported
+
+def variant_name(path, width, fmt):
+    """File name of one variant: hero.jpg -> hero-640w.webp."""
+    stem, ext = os.path.splitext(path)
+    if fmt in ('jpeg', 'png'):
+        return f"{stem}-{width}w{ext}"
+    return f"{stem}-{width}w.{fmt}"
+
+def source_size(image):
+    """Displayed (width, height) of an image, honouring its EXIF orientation."""
+    width, height = image.size
+    if image.getexif().get(0x0112) in TRANSPOSED_ORIENTATIONS:
+        return height, width
+    return width, height
+
+def variant_key(digest, width, fmt):
+    """Cache key for one variant: source hash and every encoding parameter."""
+    params = json.dumps([IMAGE_PIPELINE_VERSION, width, fmt, SAVE_OPTIONS[fmt]], sort_keys=True)
+    return hashlib.sha256(f"{digest}:{params}".encode()).hexdigest()
+
+def encode_variant(path, size, fmt, target):
+    """Resize and encode one variant of path into target."""
+    from PIL import ImageOps
+    Image = load_pillow()
+    with Image.open(path) as image:
+        image = ImageOps.exif_transpose(image)
+        if image.size != size:
+            image = image.resize(size, Image.LANCZOS)
+        if fmt == 'jpeg' and image.mode not in ('RGB', 'L'):
+            image = image.convert('RGB')
+        elif image.mode not in ('RGB', 'RGBA', 'L', 'LA') and fmt != 'png':
+            image = image.convert('RGBA' if 'transparency' in image.info else 'RGB')
+        tmp_path = f"{target}.{os.getpid()}.tmp"
+        image.save(tmp_path, format=fmt.upper(), **SAVE_OPTIONS[fmt])
+    # Atomic, since workers may race on the same key
+    os.replace(tmp_path, target)
+
+def place_variant(entry, target):
+    """Copy a cached variant to target unless target already holds the same bytes.
+
+    Leaving an unchanged target alone keeps its inode and mtime, so the site
+    hash cache does not hash it again. A changed target is replaced rather
+    than overwritten, so a hardlinked copy (deploy --plan) leaves the
+    original alone.
+    """
+    if os.path.exists(target) and os.path.getsize(target) == os.path.getsize(entry) and filecmp.cmp(entry, target, shallow=False):
+        return
+    tmp_path = f"{target}.{os.getpid()}.tmp"
+    shutil.copyfile(entry, tmp_path)
+    os.replace(tmp_path, target)
+
+def optimize_image(path, directory, widths, formats, cache_dir):
+    """Write every variant of one source image; return its manifest entry and cache hits.
+
+    Widths above the source width are clamped rather than upscaled, so the
+    loader can ask for any configured width; those share one cached encoding.
+    """
+    Image = load_pillow()
+    with open(path, 'rb') as f:
+        digest = hashlib.sha256(f.read()).hexdigest()
+    with Image.open(path) as image:
+        src_width, src_height = source_size(image)
+    source_format = SOURCE_TYPES[os.path.splitext(path)[1].lstrip('.').lower()]
+
+    variants, hits, misses = [], 0, 0
+    for width in widths:
+        clamped = min(width, src_width)
+        size = (clamped, max(1, round(src_height * clamped / src_width)))
+        # Resized copies in the source format are fallbacks for <picture>; not needed at full size
+        encodings = formats + ((source_format,) if clamped < src_width else ())
+        for fmt in encodings:
+            key = variant_key(digest, clamped, fmt)
+            entry = os.path.join(cache_dir, key[:2], key)
+            try:
+                # Marks the entry as recently used for LRU eviction
+                os.utime(entry)
+                hits += 1
+            except FileNotFoundError:
+                os.makedirs(os.path.dirname(entry), exist_ok=True)
+                encode_variant(path, size, fmt, entry)
+                misses += 1
+            target = variant_name(path, width, fmt)
+            place_variant(entry, target)
+            variants.append({
+                'src': '/' + os.path.relpath(target, directory).replace(os.sep, '/'),
+                'type': MIME_TYPES[fmt],
+                'width': size[0],
+                'height': size[1],
+                'bytes': os.path.getsize(target),
+            })
+    url = '/' + os.path.relpath(path, directory).replace(os.sep, '/')
+    record = {'width': src_width, 'height': src_height, 'bytes': os.path.getsize(path), 'variants': variants}
+    return url, record, hits, misses
+
+def _optimize_image_args(args):
+    """Unpack arguments for ProcessPoolExecutor.map."""
+    return optimize_image(*args)
+
+def load_image_manifest(directory):
+    """Return the manifest left by a previous run over directory, or {}."""
+    try:
+        with open(os.path.join(directory, MANIFEST_NAME), 'r') as f:
+            return json.load(f)
+    except (OSError, ValueError):
+        return {}
+
+def find_source_images(directory):
+    """JPEG and PNG files in directory, excluding variants written by an earlier run."""
+    previous = load_image_manifest(directory)
+    generated = {variant['src'] for record in previous.values() for variant in record.get('variants', [])}
+    paths = []
+    for root, _, files in os.walk(directory):
+        for name in files:
+            if os.path.splitext(name)[1].lstrip('.').lower() not in SOURCE_TYPES:
+                continue
+            path = os.path.join(root, name)
+            if '/' + os.path.relpath(path, directory).replace(os.sep, '/') not in generated:
+                paths.append(path)
+    return sorted(paths)
+
+def optimize_images(directory, max_workers=None):
+    """Write resized WebP/AVIF (and source format) variants of every JPEG and PNG in a static export.
+
+    Variants sit next to their source as <name>-<width>w.<ext>, and
+    image-manifest.json maps each source URL to its variants so pages can
+    build srcset/<picture> markup. Encodings are cached by source hash and
+    parameters. Returns the manifest.
+    """
+    load_pillow()
+    widths = get_image_widths()
+    formats = supported_formats(get_image_formats())
+    cache_dir = get_cache_dir()
+    jobs = [(path, directory, widths, formats, cache_dir) for path in find_source_images(directory)]
+    if len(jobs) < PARALLEL_IMAGE_THRESHOLD:
+        results = [optimize_image(*job) for job in jobs]
+    else:
+        from concurrent.futures import ProcessPoolExecutor
+        with ProcessPoolExecutor(max_workers=max_workers) as executor:
+            results = list(executor.map(_optimize_image_args, jobs))
+
+    manifest = {url: record for url, record, _, _ in results}
+    # Rewritten only when it changes, like the variants
+    if manifest != load_image_manifest(directory):
+        manifest_path = os.path.join(directory, MANIFEST_NAME)
+        with open(f"{manifest_path}.tmp", 'w') as f:
+            json.dump(manifest, f, separators=(',', ':'), sort_keys=True)
+        os.replace(f"{manifest_path}.tmp", manifest_path)
+    if os.path.isdir(cache_dir):
+        evict_lru(cache_dir, get_max_size(), label='image')
+    log_report(manifest, sum(hits for *_, hits, _ in results), sum(misses for *_, misses in results))
+    return manifest
+
+def uses_image_loader(app_dir):
+    """Whether the Next.js app in app_dir is configured with the generated image loader."""
+    for name in NEXT_CONFIG_FILES:
+        try:
+            with open(os.path.join(app_dir, name), 'r') as f:
+                if LOADER_FILE in f.read():
+                    return True
+        except OSError:
+            continue
+    return False
+
+def image_stage_enabled(directory):
+    """Whether to write image variants for the export in directory.
+
+    DEPLOY_IMAGES=true/false decides when set. Otherwise the stage runs only
+    for Next.js apps using the generated loader (looked up in the parent of
+    directory), so other sites, such as Leptos builds, neither upload unused
+    variants nor need Pillow.
+    """
+    value = os.environ.get('DEPLOY_IMAGES')
+    if value:
+        return value != 'false'
+    return uses_image_loader(os.path.dirname(os.path.abspath(directory)))
+
+def check_image_loader(directory, manifest=None):
+    """Raise if the export's image loader points at WebP variants the image stage did not write.
+
+    manifest is what optimize_images returned, or None when the stage was
+    skipped. The app is looked up in the parent of directory (next-app/out).
+    Without this check, every image would be answered by the 404 fallback
+    page with a 200.
+    """
+    if not uses_image_loader(os.path.dirname(os.path.abspath(directory))):
+        return
+    if manifest is None:
+        raise RuntimeError(
+            f"The site uses the generated {LOADER_FILE}, which needs the image stage; "
+            "drop --no-images / DEPLOY_IMAGES=false or switch next.config.js back to the default loader"
+        )
+    expected = {variant_name(url, width, 'webp') for url in manifest for width in get_image_widths()}
+    written = {variant['src'] for record in manifest.values() for variant in record['variants']}
+    missing = sorted(expected - written)
+    if missing:
+        raise RuntimeError(
+            f"{len(missing)} WebP variants requested by {LOADER_FILE} were not written (e.g. {missing[0]}); "
+            "this Pillow build may lack WebP support, or IMAGE_WIDTHS changed since the site was built"
+        )
+
+def log_report(manifest, hits, misses):
+    """Log variant counts and the bytes a visitor saves at the largest width."""
+    if not manifest:
+        logging.info("No JPEG or PNG images to optimize.")
+        return
+    variants = sum(len(record['variants']) for record in manifest.values())
+    original = sum(record['bytes'] for record in manifest.values())
+    smallest = 0
+    for record in manifest.values():
+        widest = max(variant['width'] for variant in record['variants'])
+        smallest += min([record['bytes']] + [variant['bytes'] for variant in record['variants'] if variant['width'] == widest])
+    logging.info(f"Wrote {variants} variants of {len(manifest)} images ({hits} from cache, {misses} encoded).")
+    logging.info(f"Full-size images: {original} bytes as built, {smallest} bytes in the smallest format ({1 - smallest / original:.1%} less).")
+
+if __name__ == '__main__':
+    import argparse
+    parser = argparse.ArgumentParser(description="Write responsive WebP/AVIF variants of the images in a static export.")
+    parser.add_argument('directory', nargs='?', default=os.path.join('next-app', 'out'), help='Directory containing the built site')
+    parser.add_argument('--workers', type=int, help='Worker processes (default: one per CPU)')
+    args = parser.parse_args()
+    optimize_images(args.directory, args.workers)
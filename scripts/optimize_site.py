@@ -0,0 +1,241 @@
+# File: scripts/optimize_site.py
+
+import os
+import re
+import json
+import math
+import hashlib
+import logging
+from scripts.build_cache import evict_lru
+
+# Set up logging
+logging.basicConfig(level=logging.INFO)
+
+DEFAULT_CACHE_DIR = os.path.join('~', '.cache', 'website-builder', 'minified')
+DEFAULT_MAX_SIZE_MB = 512
+# Bump when a minifier changes so cached outputs are not reused
+MINIFIER_VERSION = 2
+MAX_MINIFY_BYTES = 20 * 1024 * 1024
+# Below this many files, process start-up costs more than it saves
+PARALLEL_MINIFY_THRESHOLD = 64
+
+# Whitespace inside these elements is significant (or not HTML at all)
+HTML_PROTECTED = re.compile(r'(<(pre|textarea|script|style)\b.*?</\2\s*>)', re.IGNORECASE | re.DOTALL)
+HTML_COMMENT = re.compile(r'<!--(.*?)-->', re.DOTALL)
+# A run of pure whitespace between two tags; text nodes and attribute values are left alone
+TAG_WHITESPACE = re.compile(r'(?<=>)\s+(?=<)')
+SVG_COMMENT = re.compile(r'<!--.*?-->', re.DOTALL)
+# One React Server Components row: id, optional tag, payload
+RSC_ROW = re.compile(r'^([0-9a-zA-Z]*:)([A-Z]*)(.*)$')
+
+def get_cache_dir():
+    """Directory holding minified outputs keyed by input hash (WEBSITE_MINIFY_CACHE_DIR)."""
+    return os.path.expanduser(os.environ.get('WEBSITE_MINIFY_CACHE_DIR', DEFAULT_CACHE_DIR))
+
+def get_max_size():
+    """Size cap of the cache in bytes (WEBSITE_MINIFY_CACHE_MAX_MB)."""
+    return int(os.environ.get('WEBSITE_MINIFY_CACHE_MAX_MB', DEFAULT_MAX_SIZE_MB)) * 1024 * 1024
+
+def collapse_whitespace(match):
+    """Replace a whitespace run with one newline or space, whichever it contained."""
+    return '\n' if '\n' in match.group() else ' '
+
+def keep_html_comment(match):
+    """Keep React hydration markers (<!-- -->, <!--$-->, <!--/$-->, ...) and conditional comments."""
+    body = match.group(1).strip()
+    if not body or body.startswith(('$', '/$', '&', '[if', '<![endif')):
+        return match.group()
+    return ''
+
+def minify_html(text):
+    """Drop comments and collapse whitespace-only runs between tags, outside pre/textarea/script/style.
+
+    Text nodes keep every byte, so server-rendered text still matches what
+    React hydrates.
+    """
+    parts = HTML_PROTECTED.split(text)
+    result = []
+    # split() yields text, protected block, tag name, text, ...
+    for i in range(0, len(parts), 3):
+        segment = HTML_COMMENT.sub(keep_html_comment, parts[i])
+        result.append(TAG_WHITESPACE.sub(collapse_whitespace, segment))
+        if i + 1 < len(parts):
+            result.append(parts[i + 1])
+    return ''.join(result)
+
+def reject_constant(name):
+    """json.loads hook: NaN and Infinity are not JSON, so refuse to round-trip them."""
+    raise ValueError(f"Non-standard JSON constant {name}")
+
+def parse_finite_float(value):
+    """json.loads hook: numbers that overflow a float (1e400) would come back as Infinity."""
+    number = float(value)
+    if not math.isfinite(number):
+        raise ValueError(f"JSON number {value} does not fit in a float")
+    return number
+
+def compact_json(text):
+    """Re-serialize one JSON document without whitespace; raise ValueError if that could change it."""
+    value = json.loads(text, parse_constant=reject_constant, parse_float=parse_finite_float)
+    return json.dumps(value, separators=(',', ':'), ensure_ascii=False, allow_nan=False)
+
+def minify_json(text):
+    """Re-serialize JSON without insignificant whitespace."""
+    try:
+        return compact_json(text)
+    except ValueError:
+        return text
+
+def minify_svg(text):
+    """Drop comments and the whitespace between elements (kept around <text> content)."""
+    text = SVG_COMMENT.sub('', text)
+    if '<text' in text:
+        return TAG_WHITESPACE.sub(collapse_whitespace, text)
+    return re.sub(r'>\s+<', '><', text).strip()
+
+def minify_txt(text):
+    """Compact the JSON rows of a React Server Components payload.
+
+    Any file that is not entirely JSON rows (plain text, or RSC text rows whose
+    length prefixes would go stale) is returned unchanged.
+    """
+    rows = []
+    for line in text.split('\n'):
+        if not line:
+            rows.append(line)
+            continue
+        match = RSC_ROW.match(line)
+        if not match or match.group(2) == 'T':
+            return text
+        try:
+            payload = compact_json(match.group(3))
+        except ValueError:
+            return text
+        rows.append(match.group(1) + match.group(2) + payload)
+    return '\n'.join(rows)
+
+MINIFIERS = {
+    'html': minify_html,
+    'htm': minify_html,
+    'json': minify_json,
+    'svg': minify_svg,
+    'txt': minify_txt,
+}
+
+def file_type(path):
+    """Lower-case extension of a path, without the dot."""
+    return os.path.splitext(path)[1].lstrip('.').lower()
+
+def cache_path(key, cache_dir):
+    """Location of a cache entry, sharded by the first two hex digits."""
+    return os.path.join(cache_dir, key[:2], key)
+
+def content_key(data, ext):
+    """Cache key for one input: its content, file type and the minifier version."""
+    return hashlib.sha256(f"{MINIFIER_VERSION}:{ext}:".encode() + data).hexdigest()
+
+def store(path, data):
+    """Write a cache entry atomically (workers may race on the same key)."""
+    os.makedirs(os.path.dirname(path), exist_ok=True)
+    tmp_path = f"{path}.{os.getpid()}.tmp"
+    with open(tmp_path, 'wb') as f:
+        f.write(data)
+    os.replace(tmp_path, path)
+
+def optimize_file(path, cache_dir):
+    """Minify one file in place; return (type, bytes before, bytes after, cache hit)."""
+    ext = file_type(path)
+    with open(path, 'rb') as f:
+        data = f.read()
+    key = content_key(data, ext)
+    entry = cache_path(key, cache_dir)
+    # A hit bumps the entry's mtime for LRU eviction; another deploy sharing
+    # the cache may evict it meanwhile, which is just a miss
+    try:
+        # Already minified, e.g. out/ left over from the previous deploy
+        os.utime(entry + '.same')
+        return ext, len(data), len(data), True
+    except FileNotFoundError:
+        pass
+    try:
+        with open(entry, 'rb') as f:
+            output = f.read()
+        os.utime(entry)
+        hit = True
+    except FileNotFoundError:
+        try:
+            output = MINIFIERS[ext](data.decode('utf-8')).encode('utf-8')
+        except UnicodeDecodeError:
+            output = data
+        if len(output) >= len(data):
+            output = data
+        hit = False
+        if output == data:
+            store(entry + '.same', b'')
+        else:
+            store(entry, output)
+            store(cache_path(content_key(output, ext), cache_dir) + '.same', b'')
+    if output != data:
+        # Replace rather than rewrite, so a hardlinked copy (deploy --plan) leaves the original alone
+        store(path, output)
+    return ext, len(data), len(output), hit
+
+def _optimize_file_args(args):
+    """Unpack arguments for ProcessPoolExecutor.map."""
+    return optimize_file(*args)
+
+def optimize_site(directory, max_workers=None):
+    """Minify the HTML, RSC .txt, JSON and SVG files of a static export in place.
+
+    Results are cached by input content hash, so unchanged files are only
+    looked up on later deploys. Returns {type: {'files', 'before', 'after', 'cached'}}.
+    """
+    cache_dir = get_cache_dir()
+    paths = []
+    for root, _, files in os.walk(directory):
+        for name in files:
+            path = os.path.join(root, name)
+            if file_type(name) in MINIFIERS and os.path.getsize(path) <= MAX_MINIFY_BYTES:
+                paths.append(path)
+    jobs = [(path, cache_dir) for path in paths]
+    if len(jobs) < PARALLEL_MINIFY_THRESHOLD:
+        results = [optimize_file(*job) for job in jobs]
+    else:
+        from concurrent.futures import ProcessPoolExecutor
+        chunksize = max(1, len(jobs) // ((max_workers or os.cpu_count() or 1) * 4))
+        with ProcessPoolExecutor(max_workers=max_workers) as executor:
+            results = list(executor.map(_optimize_file_args, jobs, chunksize=chunksize))
+
+    if os.path.isdir(cache_dir):
+        evict_lru(cache_dir, get_max_size(), label='minify')
+
+    report = {}
+    for ext, before, after, hit in results:
+        totals = report.setdefault(ext, {'files': 0, 'before': 0, 'after': 0, 'cached': 0})
+        totals['files'] += 1
+        totals['before'] += before
+        totals['after'] += after
+        totals['cached'] += hit
+    log_report(report)
+    return report
+
+def log_report(report):
+    """Log bytes saved per file type."""
+    if not report:
+        logging.info("No HTML, RSC, JSON or SVG files to minify.")
+        return
+    for ext, totals in sorted(report.items()):
+        saved = totals['before'] - totals['after']
+        share = saved / totals['before'] if totals['before'] else 0
+        logging.info(f"Minified {totals['files']:>6} .{ext:<5} files: {totals['before']:>11} -> {totals['after']:>11} bytes (saved {saved} bytes, {share:.1%}; {totals['cached']} from cache)")
+    before = sum(totals['before'] for totals in report.values())
+    after = sum(totals['after'] for totals in report.values())
+    logging.info(f"Minification saved {before - after} of {before} bytes.")
+
+if __name__ == '__main__':
+    import argparse
+    parser = argparse.ArgumentParser(description="Minify a static export in place before deploying it.")
+    parser.add_argument('directory', nargs='?', default=os.path.join('next-app', 'out'), help='Directory containing the built site')
+    parser.add_argument('--workers', type=int, help='Worker processes (default: one per CPU)')
+    args = parser.parse_args()
+    optimize_site(args.directory, args.workers)
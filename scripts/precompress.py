@@ -0,0 +1,166 @@
+# File: scripts/precompress.py
+
+import os
+import gzip
+import fnmatch
+import logging
+from scripts.upload_policy import upload_policy
+from scripts.site_manifest import hash_file
+from scripts.build_cache import evict_lru
+
+# Set up logging
+logging.basicConfig(level=logging.INFO)
+
+DEFAULT_CACHE_DIR = os.path.join('~', '.cache', 'website-builder', 'compressed')
+DEFAULT_MAX_SIZE_MB = 1024
+# Bump when levels or rules change so cached encodings are not reused
+COMPRESSOR_VERSION = 1
+# CloudFront compresses objects between 1,000 bytes and 10 MB itself, at a low level
+DEFAULT_MIN_BYTES = 1024
+# Keep the original when compression saves less than this share
+MIN_SAVING = 0.05
+GZIP_LEVEL = 9
+# Below this many uncached files, process start-up costs more than it saves
+PARALLEL_COMPRESS_THRESHOLD = 16
+
+COMPRESSIBLE = ('*.js', '*.mjs', '*.css', '*.map', '*.wasm')
+# S3 stores one body per key and CloudFront serves it whatever the request's
+# Accept-Encoding, so only assets fetched by browsers (which all accept gzip)
+# are stored compressed. Pages, data and feeds stay identity and are compressed
+# by CloudFront per request.
+PRECOMPRESSED = ('_next/*', 'pkg/*', '*.wasm')
+
+def get_cache_dir():
+    """Directory holding compressed objects keyed by content hash (WEBSITE_COMPRESS_CACHE_DIR)."""
+    return os.path.expanduser(os.environ.get('WEBSITE_COMPRESS_CACHE_DIR', DEFAULT_CACHE_DIR))
+
+def get_max_size():
+    """Size cap of the cache in bytes (WEBSITE_COMPRESS_CACHE_MAX_MB)."""
+    return int(os.environ.get('WEBSITE_COMPRESS_CACHE_MAX_MB', DEFAULT_MAX_SIZE_MB)) * 1024 * 1024
+
+def touch(path):
+    """Mark a cache entry as recently used for LRU eviction; return False if it is missing."""
+    try:
+        os.utime(path)
+        return True
+    except FileNotFoundError:
+        return False
+
+def get_min_bytes():
+    """Smallest file worth precompressing, from PRECOMPRESS_MIN_BYTES."""
+    return int(os.environ.get('PRECOMPRESS_MIN_BYTES', DEFAULT_MIN_BYTES))
+
+def choose_encoding(key):
+    """Content-Encoding to store an object with, or None to upload it as is."""
+    if not any(fnmatch.fnmatchcase(key, pattern) for pattern in PRECOMPRESSED):
+        return None
+    if not any(fnmatch.fnmatchcase(key, pattern) for pattern in COMPRESSIBLE):
+        return None
+    return 'gzip'
+
+def compressed_path(entry, cache_dir=None):
+    """Cache location of an entry's compressed body, derived from its content hash."""
+    encoding = entry['content_encoding']
+    name = f"{entry['hash']}-v{COMPRESSOR_VERSION}.{encoding}"
+    return os.path.join(cache_dir or get_cache_dir(), name[:2], name)
+
+def compress_file(path, encoding, target):
+    """Compress path at the maximum level into target; return True if it saved enough."""
+    with open(path, 'rb') as f:
+        data = f.read()
+    # mtime=0 keeps the output, and so its ETag, stable across deploys
+    output = gzip.compress(data, compresslevel=GZIP_LEVEL, mtime=0)
+    keep = len(output) <= len(data) * (1 - MIN_SAVING)
+    os.makedirs(os.path.dirname(target), exist_ok=True)
+    # Atomic, since workers may race on the same key; a .none marker records "not worth it"
+    final = target if keep else target + '.none'
+    tmp_path = f"{final}.{os.getpid()}.tmp"
+    with open(tmp_path, 'wb') as f:
+        f.write(output if keep else b'')
+    os.replace(tmp_path, final)
+    return keep
+
+def _compress_file_args(args):
+    """Unpack arguments for ProcessPoolExecutor.map."""
+    return compress_file(*args)
+
+def precompress_manifest(source_dir, manifest, max_workers=None):
+    """Mark manifest entries to be uploaded compressed and make sure their bodies are cached.
+
+    JS, CSS, source map and wasm bundles of at least PRECOMPRESS_MIN_BYTES
+    get a `content_encoding` of gzip. Files in source_dir are left untouched;
+    compressed bodies live in a cache keyed by content hash, so each one is
+    compressed once across deploys and releases.
+    """
+    cache_dir = get_cache_dir()
+    min_bytes = get_min_bytes()
+
+    jobs, candidates = [], []
+    for key, entry in sorted(manifest.items()):
+        entry.pop('content_encoding', None)
+        encoding = choose_encoding(key)
+        if encoding is None or entry['size'] < min_bytes:
+            continue
+        entry['content_encoding'] = encoding
+        target = compressed_path(entry, cache_dir)
+        candidates.append((key, entry, target))
+        if not touch(target) and not touch(target + '.none'):
+            jobs.append((os.path.join(source_dir, *key.split('/')), encoding, target))
+
+    if jobs:
+        logging.info(f"Compressing {len(jobs)} files ({len(candidates) - len(jobs)} cached)...")
+    if len(jobs) < PARALLEL_COMPRESS_THRESHOLD:
+        for job in jobs:
+            compress_file(*job)
+    else:
+        from concurrent.futures import ProcessPoolExecutor
+        with ProcessPoolExecutor(max_workers=max_workers) as executor:
+            list(executor.map(_compress_file_args, jobs))
+
+    report = {}
+    for key, entry, target in candidates:
+        if not os.path.exists(target):
+            del entry['content_encoding']
+            continue
+        totals = report.setdefault(entry['content_encoding'], {'files': 0, 'before': 0, 'after': 0})
+        totals['files'] += 1
+        totals['before'] += entry['size']
+        totals['after'] += os.path.getsize(target)
+    for encoding, totals in sorted(report.items()):
+        logging.info(f"Precompressed {totals['files']} files with {encoding}: {totals['before']} -> {totals['after']} bytes ({1 - totals['after'] / totals['before']:.1%} smaller).")
+    # This deploy uploads from the entries it just used, so those are never evicted
+    keep = [path for _, _, target in candidates for path in (target, target + '.none')]
+    if os.path.isdir(cache_dir):
+        evict_lru(cache_dir, get_max_size(), keep=keep, label='compressed')
+    return manifest
+
+def expected_size(entry):
+    """Size the uploaded object has, honouring precompression."""
+    if entry.get('content_encoding'):
+        return os.path.getsize(compressed_path(entry))
+    return entry['size']
+
+def expected_md5(entry):
+    """MD5 of the uploaded body (its single-part ETag), honouring precompression."""
+    if entry.get('content_encoding'):
+        return hash_file(compressed_path(entry))
+    return entry['hash']
+
+def upload_resolvers(source_dir, manifest):
+    """Return (path_for, extra_args_for) that upload precompressed entries from the cache."""
+    cache_dir = get_cache_dir()
+
+    def path_for(key):
+        entry = manifest.get(key, {})
+        if entry.get('content_encoding'):
+            return compressed_path(entry, cache_dir)
+        return os.path.join(source_dir, *key.split('/'))
+
+    def extra_args_for(key):
+        args = upload_policy(key)
+        encoding = manifest.get(key, {}).get('content_encoding')
+        if encoding:
+            args['ContentEncoding'] = encoding
+        return args
+
+    return path_for, extra_args_for
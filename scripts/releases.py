@@ -0,0 +1,122 @@
+# File: scripts/releases.py
+
+import os
+import json
+import time
+import logging
+from scripts.s3_sync import upload_files, copy_keys, delete_keys, list_bucket, summarize_results
+from scripts.upload_policy import upload_policy
+
+# Set up logging
+logging.basicConfig(level=logging.INFO)
+
+# Each build lives under releases/<id>/ and is never modified after upload. The
+# CloudFront origin path points at the live one; manifests of every release are
+# kept outside the served prefix so any machine can diff, roll back or prune.
+RELEASES_PREFIX = 'releases/'
+RELEASE_MANIFESTS_PREFIX = '_releases/'
+DEFAULT_RETENTION = 5
+
+def new_release_id(site_hash):
+    """Build a sortable release ID from the current UTC time and the site hash."""
+    return f"{time.strftime('%Y%m%dT%H%M%SZ', time.gmtime())}-{site_hash[:8]}"
+
+def release_prefix(release_id):
+    """Return the S3 key prefix holding a release."""
+    return f"{RELEASES_PREFIX}{release_id}/"
+
+def get_retention():
+    """Number of releases to keep, from DEPLOY_RELEASE_RETENTION."""
+    return max(1, int(os.environ.get('DEPLOY_RELEASE_RETENTION', DEFAULT_RETENTION)))
+
+def get_live_release(cf, distribution_id):
+    """Return the release the distribution's origin path points at, or None."""
+    config = cf.get_distribution_config(Id=distribution_id)['DistributionConfig']
+    origin_path = config['Origins']['Items'][0].get('OriginPath', '')
+    prefix = '/' + RELEASES_PREFIX
+    if origin_path.startswith(prefix):
+        return origin_path[len(prefix):].strip('/')
+    return None
+
+def set_origin_path(cf, distribution_id, origin_path, wait=True):
+    """Point the distribution's S3 origin at origin_path in a single config update."""
+    response = cf.get_distribution_config(Id=distribution_id)
+    config = response['DistributionConfig']
+    config['Origins']['Items'][0]['OriginPath'] = origin_path
+    cf.update_distribution(Id=distribution_id, IfMatch=response['ETag'], DistributionConfig=config)
+    logging.info(f"Switched CloudFront distribution '{distribution_id}' origin path to '{origin_path or '/'}'.")
+    if wait:
+        logging.info("Waiting for the distribution change to reach all edge locations...")
+        cf.get_waiter('distribution_deployed').wait(Id=distribution_id)
+
+def load_release_manifest(s3, bucket_name, release_id):
+    """Fetch the manifest stored for a release, or None if it does not exist."""
+    try:
+        response = s3.get_object(Bucket=bucket_name, Key=f"{RELEASE_MANIFESTS_PREFIX}{release_id}.json")
+    except s3.exceptions.NoSuchKey:
+        return None
+    return json.loads(response['Body'].read())
+
+def save_release_manifest(s3, bucket_name, release_id, manifest):
+    """Store a release manifest next to (not inside) the served release prefixes."""
+    s3.put_object(
+        Bucket=bucket_name,
+        Key=f"{RELEASE_MANIFESTS_PREFIX}{release_id}.json",
+        Body=json.dumps(manifest, sort_keys=True).encode(),
+        ContentType='application/json'
+    )
+
+def has_releases(s3, bucket_name):
+    """Whether the bucket holds any release manifest, with a single one-key listing."""
+    response = s3.list_objects_v2(Bucket=bucket_name, Prefix=RELEASE_MANIFESTS_PREFIX, MaxKeys=1)
+    return response.get('KeyCount', 0) > 0
+
+def list_releases(s3, bucket_name):
+    """Return all release IDs with a stored manifest, oldest first."""
+    keys = list_bucket(s3, bucket_name, prefix=RELEASE_MANIFESTS_PREFIX)
+    return sorted(key[len(RELEASE_MANIFESTS_PREFIX):-len('.json')] for key in keys if key.endswith('.json'))
+
+def publish_release(s3, bucket_name, source_dir, release_id, manifest, previous_release=None, previous_manifest=None, max_workers=None, path_for=None, extra_args_for=upload_policy):
+    """Upload a build under its release prefix.
+
+    Files identical to the previous release are copied server-side instead of
+    being uploaded again, so only the delta crosses the network. path_for and
+    extra_args_for take the key relative to the release.
+    """
+    prefix = release_prefix(release_id)
+    uploads, copies = [], []
+    for key, entry in sorted(manifest.items()):
+        if previous_manifest and previous_manifest.get(key) == entry:
+            copies.append((release_prefix(previous_release) + key, prefix + key))
+        else:
+            uploads.append((prefix + key, path_for(key) if path_for else os.path.join(source_dir, *key.split('/'))))
+    logging.info(f"Publishing release '{release_id}': {len(uploads)} files to upload, {len(copies)} to copy from '{previous_release}'.")
+
+    def release_extra_args_for(key):
+        return extra_args_for(key[len(prefix):])
+
+    results = upload_files(s3, bucket_name, uploads, release_extra_args_for, max_workers)
+    if copies:
+        results += copy_keys(s3, bucket_name, copies, max_workers)
+    summarize_results(results)
+    save_release_manifest(s3, bucket_name, release_id, manifest)
+    return results
+
+def prune_releases(s3, bucket_name, keep, protected=(), max_workers=None):
+    """Delete all but the newest `keep` releases, never touching protected ones."""
+    releases = list_releases(s3, bucket_name)
+    doomed = [release_id for release_id in releases[:-keep] if release_id not in protected]
+    if not doomed:
+        return []
+    keys = []
+    for release_id in doomed:
+        # A release holds exactly the keys of its manifest; list only if that is gone
+        manifest = load_release_manifest(s3, bucket_name, release_id)
+        if manifest is not None:
+            keys.extend(release_prefix(release_id) + key for key in manifest)
+        else:
+            keys.extend(list_bucket(s3, bucket_name, prefix=release_prefix(release_id)))
+        keys.append(f"{RELEASE_MANIFESTS_PREFIX}{release_id}.json")
+    summarize_results(delete_keys(s3, bucket_name, keys, max_workers, progress=None))
+    logging.info(f"Pruned {len(doomed)} old releases ({len(keys)} objects): {', '.join(doomed)}")
+    return doomed
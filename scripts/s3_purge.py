@@ -0,0 +1,169 @@
+# File: scripts/s3_purge.py
+
+import os
+import time
+import random
+import logging
+import threading
+from concurrent.futures import ThreadPoolExecutor, wait, FIRST_COMPLETED
+from scripts.aws_clients import get_client
+
+# Set up logging
+logging.basicConfig(level=logging.INFO)
+
+DELETE_BATCH_SIZE = 1000
+DEFAULT_PURGE_CONCURRENCY = 32
+# Prefix levels listed independently; releases/<id>/ needs two
+DEFAULT_FANOUT_DEPTH = 2
+LIST_WORKERS = 8
+MAX_BATCH_ATTEMPTS = 6
+RETRYABLE_CODES = {'SlowDown', 'InternalError', 'ServiceUnavailable', 'RequestTimeout', 'Throttling', 'ThrottlingException'}
+PROGRESS_INTERVAL = 5
+
+def get_purge_concurrency(max_workers=None):
+    """Resolve the number of concurrent DeleteObjects calls (S3_PURGE_CONCURRENCY)."""
+    if max_workers:
+        return max_workers
+    return int(os.environ.get('S3_PURGE_CONCURRENCY', DEFAULT_PURGE_CONCURRENCY))
+
+def iter_version_pages(s3, bucket_name, prefix='', delimiter=None):
+    """Yield (objects, common_prefixes) per page, covering versions and delete markers.
+
+    Unversioned buckets are listed the same way; their objects have VersionId 'null'.
+    """
+    kwargs = {'Bucket': bucket_name, 'Prefix': prefix}
+    if delimiter:
+        kwargs['Delimiter'] = delimiter
+    for page in s3.get_paginator('list_object_versions').paginate(**kwargs):
+        objects = [
+            {'Key': entry['Key'], 'VersionId': entry['VersionId']}
+            for entry in page.get('Versions', []) + page.get('DeleteMarkers', [])
+        ]
+        prefixes = [common['Prefix'] for common in page.get('CommonPrefixes', [])]
+        yield objects, prefixes
+
+def backoff(attempt):
+    """Sleep with full jitter, growing with each attempt up to 20 seconds."""
+    time.sleep(random.uniform(0, min(20, 0.5 * 2 ** attempt)))
+
+def delete_batch(s3, bucket_name, objects):
+    """Delete up to 1000 object versions, retrying throttled keys; return (deleted, errors)."""
+    deleted, errors = 0, []
+    for attempt in range(MAX_BATCH_ATTEMPTS):
+        try:
+            response = s3.delete_objects(Bucket=bucket_name, Delete={'Objects': objects, 'Quiet': True})
+        except s3.exceptions.ClientError as e:
+            if e.response['Error']['Code'] not in RETRYABLE_CODES or attempt == MAX_BATCH_ATTEMPTS - 1:
+                raise
+            backoff(attempt)
+            continue
+        failures = response.get('Errors', [])
+        deleted += len(objects) - len(failures)
+        retry = [failure for failure in failures if failure['Code'] in RETRYABLE_CODES]
+        errors.extend(failure for failure in failures if failure['Code'] not in RETRYABLE_CODES)
+        if not retry:
+            return deleted, errors
+        objects = [{'Key': failure['Key'], 'VersionId': failure['VersionId']} if failure.get('VersionId') else {'Key': failure['Key']} for failure in retry]
+        backoff(attempt)
+    errors.extend({'Key': obj['Key'], 'Code': 'SlowDown', 'Message': 'Gave up after repeated throttling'} for obj in objects)
+    return deleted, errors
+
+def purge_bucket(s3, bucket_name, max_workers=None, fanout_depth=DEFAULT_FANOUT_DEPTH, progress=True):
+    """Delete every object version and delete marker in a bucket.
+
+    Prefixes down to fanout_depth levels are listed in parallel, and each
+    listed page is handed straight to a pool of concurrent DeleteObjects
+    calls; a semaphore keeps listing from running far ahead of deletion.
+    Returns (deleted, errors).
+    """
+    max_workers = get_purge_concurrency(max_workers)
+    in_flight = threading.BoundedSemaphore(max_workers * 2)
+    lock = threading.Lock()
+    state = {'deleted': 0, 'errors': [], 'reported': time.monotonic()}
+    started = time.monotonic()
+    futures = set()
+
+    def track(future):
+        with lock:
+            futures.add(future)
+
+    def delete_page(objects):
+        try:
+            deleted, errors = delete_batch(s3, bucket_name, objects)
+        finally:
+            in_flight.release()
+        with lock:
+            state['deleted'] += deleted
+            state['errors'].extend(errors)
+            now = time.monotonic()
+            if progress and now - state['reported'] >= PROGRESS_INTERVAL:
+                state['reported'] = now
+                logging.info(f"Purging '{bucket_name}': {state['deleted']} versions deleted ({state['deleted'] / (now - started):.0f}/s)...")
+
+    def submit_deletes(objects):
+        for i in range(0, len(objects), DELETE_BATCH_SIZE):
+            in_flight.acquire()
+            track(delete_executor.submit(delete_page, objects[i:i + DELETE_BATCH_SIZE]))
+
+    def list_prefix(prefix, depth):
+        delimiter = '/' if depth > 0 else None
+        for objects, prefixes in iter_version_pages(s3, bucket_name, prefix, delimiter):
+            submit_deletes(objects)
+            for child in prefixes:
+                track(list_executor.submit(list_prefix, child, depth - 1))
+
+    with ThreadPoolExecutor(max_workers=LIST_WORKERS) as list_executor, ThreadPoolExecutor(max_workers=max_workers) as delete_executor:
+        track(list_executor.submit(list_prefix, '', fanout_depth))
+        while True:
+            with lock:
+                pending = {future for future in futures if not future.done()}
+                finished = futures - pending
+                futures.difference_update(finished)
+            for future in finished:
+                # Surface listing and non-retryable delete failures
+                future.result()
+            if not pending:
+                break
+            wait(pending, return_when=FIRST_COMPLETED)
+
+    seconds = time.monotonic() - started
+    logging.info(f"Purged {state['deleted']} object versions from '{bucket_name}' in {seconds:.1f}s ({len(state['errors'])} failures).")
+    return state['deleted'], state['errors']
+
+def abort_multipart_uploads(s3, bucket_name):
+    """Abort unfinished multipart uploads so their parts stop blocking deletion."""
+    count = 0
+    for page in s3.get_paginator('list_multipart_uploads').paginate(Bucket=bucket_name):
+        for upload in page.get('Uploads', []):
+            s3.abort_multipart_upload(Bucket=bucket_name, Key=upload['Key'], UploadId=upload['UploadId'])
+            count += 1
+    if count:
+        logging.info(f"Aborted {count} unfinished multipart uploads in '{bucket_name}'.")
+
+def empty_bucket(bucket_name, aws_profile=None, max_workers=None):
+    """Empty a (possibly versioned) bucket in parallel; return False if it does not exist."""
+    max_workers = get_purge_concurrency(max_workers)
+    s3 = get_client('s3', profile=aws_profile, max_pool_connections=max_workers + LIST_WORKERS)
+    try:
+        s3.head_bucket(Bucket=bucket_name)
+    except s3.exceptions.ClientError as e:
+        if e.response['Error']['Code'] in ('404', 'NoSuchBucket'):
+            logging.info(f"S3 bucket '{bucket_name}' does not exist. Skipping.")
+            return False
+        raise
+    logging.info(f"Emptying S3 bucket '{bucket_name}' with {max_workers} concurrent deletes...")
+    abort_multipart_uploads(s3, bucket_name)
+    _, errors = purge_bucket(s3, bucket_name, max_workers)
+    if errors:
+        for error in errors[:10]:
+            logging.error(f"Could not delete {error['Key']}: {error['Code']} {error.get('Message', '')}")
+        raise RuntimeError(f"{len(errors)} object versions could not be deleted from '{bucket_name}'")
+    return True
+
+def empty_and_delete_bucket(bucket_name, aws_profile=None, max_workers=None):
+    """Empty a (possibly versioned) bucket in parallel and delete it; return False if it is gone already."""
+    if not empty_bucket(bucket_name, aws_profile, max_workers):
+        return False
+    get_client('s3', profile=aws_profile).delete_bucket(Bucket=bucket_name)
+    logging.info(f"Deleted S3 bucket '{bucket_name}'.")
+    return True
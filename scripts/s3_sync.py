@@ -0,0 +1,202 @@
+# File: scripts/s3_sync.py
+
+import os
+import logging
+import time
+from concurrent.futures import ThreadPoolExecutor, as_completed
+from scripts.upload_policy import upload_policy
+from scripts.aws_clients import get_client
+
+# Set up logging
+logging.basicConfig(level=logging.INFO)
+
+DEFAULT_CONCURRENCY = 16
+DELETE_BATCH_SIZE = 1000
+# Directory levels listed one prefix per request before listing the rest in full
+DEFAULT_LIST_FANOUT_DEPTH = 3
+LIST_WORKERS = 16
+
+def get_concurrency(max_workers=None):
+    """Resolve the transfer concurrency from the argument or S3_SYNC_CONCURRENCY."""
+    if max_workers:
+        return max_workers
+    return int(os.environ.get('S3_SYNC_CONCURRENCY', DEFAULT_CONCURRENCY))
+
+def get_s3_client(aws_profile, max_workers):
+    """Return the shared S3 client, with a connection pool sized for the worker pool."""
+    return get_client('s3', profile=aws_profile, max_pool_connections=max_workers)
+
+def list_bucket(s3, bucket_name, prefix=''):
+    """Return {key: (size, last_modified_epoch)} for every object under prefix."""
+    objects = {}
+    paginator = s3.get_paginator('list_objects_v2')
+    for page in paginator.paginate(Bucket=bucket_name, Prefix=prefix):
+        for obj in page.get('Contents', []):
+            objects[obj['Key']] = (obj['Size'], obj['LastModified'].timestamp())
+    return objects
+
+def list_bucket_parallel(s3, bucket_name, prefix='', fanout_depth=DEFAULT_LIST_FANOUT_DEPTH, max_workers=LIST_WORKERS, exclude=()):
+    """Return {key: {'size', 'etag'}} for every object under prefix, listing prefixes in parallel.
+
+    The first fanout_depth directory levels are listed with a '/' delimiter,
+    one ListObjectsV2 paginator per prefix on a thread pool; the prefixes
+    found at the last level are then listed in full. Prefixes in exclude are
+    skipped entirely.
+    """
+    objects = {}
+
+    def list_level(level_prefix, delimiter):
+        found, children = {}, []
+        kwargs = {'Bucket': bucket_name, 'Prefix': level_prefix}
+        if delimiter:
+            kwargs['Delimiter'] = delimiter
+        for page in s3.get_paginator('list_objects_v2').paginate(**kwargs):
+            for obj in page.get('Contents', []):
+                found[obj['Key']] = {'size': obj['Size'], 'etag': obj['ETag'].strip('"')}
+            children.extend(common['Prefix'] for common in page.get('CommonPrefixes', []))
+        return found, [child for child in children if child not in exclude]
+
+    with ThreadPoolExecutor(max_workers=max_workers) as executor:
+        level = [prefix]
+        for depth in range(fanout_depth, -1, -1):
+            delimiter = '/' if depth > 0 else None
+            next_level = []
+            for found, children in executor.map(lambda p: list_level(p, delimiter), level):
+                objects.update(found)
+                next_level.extend(children)
+            if not next_level:
+                break
+            level = next_level
+    return objects
+
+def log_progress(result, done, total):
+    """Default per-file progress reporter."""
+    if result['error']:
+        logging.error(f"[{done}/{total}] {result['action']} failed: {result['key']}: {result['error']}")
+    else:
+        logging.info(f"[{done}/{total}] {result['action']}: {result['key']} ({result['bytes']} bytes, {result['seconds']:.2f}s)")
+
+def upload_files(s3, bucket_name, uploads, extra_args_for, max_workers=None, progress=log_progress):
+    """Upload (key, path) pairs concurrently and return one result dict per file."""
+    from boto3.s3.transfer import TransferConfig
+    max_workers = get_concurrency(max_workers)
+    transfer_config = TransferConfig(max_concurrency=4)
+    total = len(uploads)
+    results = []
+
+    def upload_one(key, path):
+        started = time.monotonic()
+        result = {'key': key, 'action': 'upload', 'bytes': os.path.getsize(path), 'error': None}
+        try:
+            s3.upload_file(path, bucket_name, key, ExtraArgs=extra_args_for(key), Config=transfer_config)
+        except Exception as e:
+            result['error'] = str(e)
+        result['seconds'] = time.monotonic() - started
+        return result
+
+    with ThreadPoolExecutor(max_workers=max_workers) as executor:
+        futures = [executor.submit(upload_one, key, path) for key, path in uploads]
+        for future in as_completed(futures):
+            result = future.result()
+            results.append(result)
+            if progress:
+                progress(result, len(results), total)
+    return results
+
+def copy_keys(s3, bucket_name, copies, max_workers=None, progress=log_progress):
+    """Server-side copy (source_key, dest_key) pairs concurrently, keeping metadata."""
+    max_workers = get_concurrency(max_workers)
+    total = len(copies)
+    results = []
+
+    def copy_one(source_key, dest_key):
+        started = time.monotonic()
+        result = {'key': dest_key, 'action': 'copy', 'bytes': 0, 'error': None}
+        try:
+            s3.copy_object(
+                Bucket=bucket_name,
+                Key=dest_key,
+                CopySource={'Bucket': bucket_name, 'Key': source_key},
+                MetadataDirective='COPY'
+            )
+        except Exception as e:
+            result['error'] = str(e)
+        result['seconds'] = time.monotonic() - started
+        return result
+
+    with ThreadPoolExecutor(max_workers=max_workers) as executor:
+        futures = [executor.submit(copy_one, source_key, dest_key) for source_key, dest_key in copies]
+        for future in as_completed(futures):
+            result = future.result()
+            results.append(result)
+            if progress:
+                progress(result, len(results), total)
+    return results
+
+def delete_keys(s3, bucket_name, keys, max_workers=None, progress=log_progress):
+    """Delete keys in parallel DeleteObjects batches and return one result dict per key."""
+    keys = sorted(keys)
+    max_workers = get_concurrency(max_workers)
+    batches = [keys[i:i + DELETE_BATCH_SIZE] for i in range(0, len(keys), DELETE_BATCH_SIZE)]
+    total = len(keys)
+    results = []
+
+    def delete_batch(batch):
+        started = time.monotonic()
+        batch_results = {key: {'key': key, 'action': 'delete', 'bytes': 0, 'error': None} for key in batch}
+        try:
+            response = s3.delete_objects(
+                Bucket=bucket_name,
+                Delete={'Objects': [{'Key': key} for key in batch], 'Quiet': True}
+            )
+            for error in response.get('Errors', []):
+                batch_results[error['Key']]['error'] = error.get('Message', error.get('Code'))
+        except Exception as e:
+            for result in batch_results.values():
+                result['error'] = str(e)
+        elapsed = time.monotonic() - started
+        for result in batch_results.values():
+            result['seconds'] = elapsed
+        return list(batch_results.values())
+
+    with ThreadPoolExecutor(max_workers=max_workers) as executor:
+        futures = [executor.submit(delete_batch, batch) for batch in batches]
+        for future in as_completed(futures):
+            for result in future.result():
+                results.append(result)
+                if progress:
+                    progress(result, len(results), total)
+    return results
+
+def summarize_results(results):
+    """Log a transfer summary and raise if any file failed."""
+    failed = [r for r in results if r['error']]
+    uploaded = [r for r in results if r['action'] == 'upload' and not r['error']]
+    copied = [r for r in results if r['action'] == 'copy' and not r['error']]
+    deleted = [r for r in results if r['action'] == 'delete' and not r['error']]
+    total_bytes = sum(r['bytes'] for r in uploaded)
+    logging.info(f"Uploaded {len(uploaded)} files ({total_bytes} bytes), copied {len(copied)} objects, deleted {len(deleted)} objects, {len(failed)} failures.")
+    if failed:
+        raise RuntimeError(f"{len(failed)} S3 transfers failed; first error: {failed[0]['key']}: {failed[0]['error']}")
+
+def transfer(s3, bucket_name, source_dir, upload_keys, removals, extra_args_for=upload_policy, max_workers=None, progress=log_progress, path_for=None):
+    """Upload upload_keys from source_dir, then delete removals, and return the results.
+
+    path_for(key) overrides where a key's body is read from (e.g. a precompressed copy).
+    """
+    started = time.monotonic()
+    uploads = [(key, path_for(key) if path_for else os.path.join(source_dir, *key.split('/'))) for key in upload_keys]
+    results = upload_files(s3, bucket_name, uploads, extra_args_for, max_workers, progress)
+    # Remove stale objects only after every new object is in place
+    if removals:
+        results += delete_keys(s3, bucket_name, removals, max_workers, progress)
+    logging.info(f"Transfer finished in {time.monotonic() - started:.2f}s using {get_concurrency(max_workers)} workers.")
+    summarize_results(results)
+    return results
+
+def apply_delta(bucket_name, source_dir, aws_profile, upload_keys, removals, extra_args_for=upload_policy, max_workers=None, progress=log_progress, path_for=None):
+    """Apply a precomputed delta without listing the bucket."""
+    max_workers = get_concurrency(max_workers)
+    s3 = get_s3_client(aws_profile, max_workers)
+    logging.info(f"Applying delta: {len(upload_keys)} to upload, {len(removals)} to delete.")
+    return transfer(s3, bucket_name, source_dir, upload_keys, removals, extra_args_for, max_workers, progress, path_for)
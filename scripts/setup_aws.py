@@ -1,13 +1,14 @@
 # File: scripts/setup_aws.py
 
-import boto3
 import os
 import logging
 import time
-from botocore.exceptions import ProfileNotFound, NoCredentialsError, ClientError
+import random
 from dotenv import load_dotenv
+from scripts.aws_clients import get_session, get_client, get_account_id
 import sys
 from datetime import datetime, timedelta
+from concurrent.futures import ThreadPoolExecutor
 
 # Load environment variables from .env file if present
 load_dotenv()
@@ -15,8 +16,21 @@ load_dotenv()
 # Set up logging
 logging.basicConfig(level=logging.INFO)
 
-def setup_aws_credentials():
-    """Set up AWS credentials using the specified profile."""
+# Domain operations are polled with jittered backoff capped at POLL_MAX_DELAY
+# seconds; the whole nameserver update gives up after NAMESERVER_UPDATE_DEADLINE
+POLL_INITIAL_DELAY = 2
+POLL_MAX_DELAY = 15
+DEFAULT_NAMESERVER_DEADLINE = 600
+OPERATION_DONE_STATUSES = ('SUCCESSFUL', 'ERROR', 'FAILED')
+
+_delegation = None
+
+def setup_aws_credentials(validate=True):
+    """Set up AWS credentials using the specified profile.
+
+    With validate=False the STS check is left to preflight(), which runs it
+    alongside the other lookups.
+    """
     # Get the AWS profile from environment variable
     aws_profile = os.environ.get('AWS_PROFILE') or os.environ.get('AWS_DEFAULT_PROFILE')
     
@@ -25,10 +39,11 @@ def setup_aws_credentials():
         sys.exit(1)
     
     try:
-        session = boto3.Session(profile_name=aws_profile)
-        # Test the credentials by making a simple API call
-        sts = session.client('sts')
-        sts.get_caller_identity()
+        session = get_session(aws_profile)
+        if not validate:
+            return session
+        # Test the credentials by making a simple API call (cached for later stages)
+        get_account_id(aws_profile)
         logging.info(f"Successfully authenticated using AWS profile: {aws_profile}")
         return session
     except Exception as e:
@@ -37,107 +52,253 @@ def setup_aws_credentials():
 
 def get_registered_nameservers(domain_name, session):
     """Get the registered nameservers for a domain."""
-    client = session.client('route53domains')
+    client = get_client('route53domains', profile=session.profile_name)
     try:
         response = client.get_domain_detail(DomainName=domain_name)
         return sorted([ns['Name'] for ns in response['Nameservers']])
-    except ClientError as e:
+    except client.exceptions.ClientError as e:
         logging.error(f"Error getting registered nameservers: {str(e)}")
         return []
 
 def get_hosted_zone_nameservers(hosted_zone_id, session):
     """Get the nameservers for a hosted zone."""
-    client = session.client('route53')
+    client = get_client('route53', profile=session.profile_name)
     try:
         response = client.get_hosted_zone(Id=hosted_zone_id)
         return sorted(response['DelegationSet']['NameServers'])
-    except ClientError as e:
+    except client.exceptions.ClientError as e:
         logging.error(f"Error getting hosted zone nameservers: {str(e)}")
         return []
 
-def check_pending_operations(domain_name, session):
-    """Check and wait for pending operations on a domain."""
-    client = session.client('route53domains')
+def get_pending_operations(domain_name, session):
+    """Return the IDs of domain operations that are still in progress."""
+    client = get_client('route53domains', profile=session.profile_name)
+    response = client.list_operations(
+        SubmittedSince=datetime.now() - timedelta(days=30)
+    )
+    return [op['OperationId'] for op in response['Operations'] if op['Status'] == 'IN_PROGRESS' and op['DomainName'] == domain_name]
+
+def get_nameserver_deadline():
+    """Seconds the nameserver update may take in total (NAMESERVER_UPDATE_DEADLINE)."""
+    return float(os.environ.get('NAMESERVER_UPDATE_DEADLINE', DEFAULT_NAMESERVER_DEADLINE))
+
+def poll_delays(initial=POLL_INITIAL_DELAY, cap=POLL_MAX_DELAY):
+    """Yield jittered, exponentially growing delays that never exceed cap."""
+    delay = initial
+    while True:
+        yield random.uniform(delay / 2, delay)
+        delay = min(delay * 2, cap)
+
+def sleep_until_next_poll(delays, deadline):
+    """Sleep for the next backoff delay; return False if that would pass the deadline."""
+    delay = next(delays)
+    remaining = deadline - time.monotonic()
+    if remaining <= 0:
+        return False
+    time.sleep(min(delay, remaining))
+    return True
+
+def wait_for_operation(domain_name, session, operation_id, deadline):
+    """Poll a domain operation until it finishes or the deadline passes; return its status."""
+    client = get_client('route53domains', profile=session.profile_name)
+    delays = poll_delays()
+    while True:
+        status = client.get_operation_detail(OperationId=operation_id)['Status']
+        if status in OPERATION_DONE_STATUSES:
+            logging.info(f"Domain operation {operation_id} for {domain_name} finished: {status}")
+            return status
+        if not sleep_until_next_poll(delays, deadline):
+            raise TimeoutError(f"Domain operation {operation_id} for {domain_name} is still {status}")
+
+def check_pending_operations(domain_name, session, pending_ops=None, deadline=None):
+    """Check and wait, concurrently, for pending operations on a domain."""
+    client = get_client('route53domains', profile=session.profile_name)
+    deadline = deadline or time.monotonic() + get_nameserver_deadline()
     try:
-        response = client.list_operations(
-            SubmittedSince=datetime.now() - timedelta(days=30)
-        )
-        pending_ops = [op['OperationId'] for op in response['Operations'] if op['Status'] == 'IN_PROGRESS' and op['DomainName'] == domain_name]
+        if pending_ops is None:
+            pending_ops = get_pending_operations(domain_name, session)
         
         if pending_ops:
-            logging.info(f"Pending operations found for {domain_name}. Waiting for completion...")
-            waiter = client.get_waiter('operation_successful')
-            for op_id in pending_ops:
-                waiter.wait(OperationId=op_id)
+            logging.info(f"{len(pending_ops)} pending operations found for {domain_name}. Waiting for completion...")
+            with ThreadPoolExecutor(max_workers=len(pending_ops)) as executor:
+                for future in [executor.submit(wait_for_operation, domain_name, session, op_id, deadline) for op_id in pending_ops]:
+                    future.result()
             logging.info("Pending operations completed.")
-    except ClientError as e:
+    except client.exceptions.ClientError as e:
         logging.error(f"Error checking pending operations: {str(e)}")
 
-def update_registered_nameservers(domain_name, hosted_zone_nameservers, session):
-    """Update the registered nameservers for a domain."""
-    client = session.client('route53domains')
-    max_retries = 5
-    retry_delay = 30
+def update_registered_nameservers(domain_name, hosted_zone_nameservers, session, pending_ops=None, wait=False):
+    """Update the registered nameservers for a domain; return False if the update was not accepted.
 
-    for attempt in range(max_retries):
+    Retries are driven by operation status and a short, jittered backoff
+    until NAMESERVER_UPDATE_DEADLINE. By default this returns once the
+    registrar accepts the update; with wait=True the operation is also
+    polled until Route 53 Domains reports it finished. An accepted update
+    that is still running at the deadline counts as submitted, not failed.
+    """
+    client = get_client('route53domains', profile=session.profile_name)
+    deadline = time.monotonic() + get_nameserver_deadline()
+    delays = poll_delays()
+    attempt = 0
+
+    while True:
+        attempt += 1
         try:
-            check_pending_operations(domain_name, session)
-            client.update_domain_nameservers(
+            # The preflight's list of pending operations is only fresh for the first attempt
+            check_pending_operations(domain_name, session, pending_ops if attempt == 1 else None, deadline)
+            response = client.update_domain_nameservers(
                 DomainName=domain_name,
                 Nameservers=[{'Name': ns} for ns in hosted_zone_nameservers]
             )
-            logging.info(f"Updated registered nameservers for {domain_name}")
-            return True
-        except ClientError as e:
-            logging.error(f"Failed to update nameservers: {str(e)}")
-            if attempt < max_retries - 1:
-                logging.info(f"Retrying in {retry_delay} seconds... (Attempt {attempt + 1} of {max_retries})")
-                time.sleep(retry_delay)
-                retry_delay *= 2
-            else:
-                logging.error(f"Failed to update nameservers after {max_retries} attempts.")
-                return False
+            operation_id = response['OperationId']
+            logging.info(f"Submitted nameserver update for {domain_name} (operation {operation_id})")
+            if not wait:
+                return True
+            try:
+                return wait_for_operation(domain_name, session, operation_id, deadline) == 'SUCCESSFUL'
+            except TimeoutError:
+                logging.warning(f"Nameserver update for {domain_name} was submitted and is still pending (operation {operation_id}); the registrar will finish it on its own.")
+                return True
+        except client.exceptions.ClientError as e:
+            logging.error(f"Failed to update nameservers (attempt {attempt}): {str(e)}")
+        except TimeoutError as e:
+            logging.error(f"Gave up waiting for nameserver update: {str(e)}")
+            return False
+        if not sleep_until_next_poll(delays, deadline):
+            logging.error(f"Failed to update nameservers after {attempt} attempts within {get_nameserver_deadline():.0f}s.")
+            return False
+
+def sync_nameservers(domain_name, hosted_zone_nameservers, session, pending_ops=None, wait=False):
+    """Point the domain registration at the hosted zone's nameservers and report the outcome."""
+    if update_registered_nameservers(domain_name, hosted_zone_nameservers, session, pending_ops, wait=wait):
+        # The outcome (accepted, finished or still pending) is logged by the update itself
+        return True
+    logging.warning("Failed to update nameservers. Manual intervention may be required.")
+    return False
+
+def finish_delegation():
+    """Wait for a nameserver update started in the background; return its outcome."""
+    global _delegation
+    if _delegation is None:
+        return True
+    logging.info("Waiting for the background nameserver update to finish...")
+    try:
+        return _delegation.result()
+    finally:
+        _delegation = None
+
+def find_hosted_zone(domain_name, session):
+    """Return the ID of the domain's hosted zone, or None if there is none."""
+    client = get_client('route53', profile=session.profile_name)
+    hosted_zones = client.list_hosted_zones_by_name(DNSName=domain_name)['HostedZones']
+    for zone in hosted_zones:
+        if zone['Name'] == domain_name + '.':
+            return zone['Id'].split('/')[-1]
+    return None
+
+def lookup_hosted_zone(domain_name, session):
+    """Return (hosted zone ID, its nameservers), or (None, []) if there is no zone."""
+    hosted_zone_id = find_hosted_zone(domain_name, session)
+    if not hosted_zone_id:
+        return None, []
+    return hosted_zone_id, get_hosted_zone_nameservers(hosted_zone_id, session)
+
+def preflight(domain_name, session):
+    """Check credentials, hosted zone, registered nameservers and pending operations.
+
+    The lookups go to different endpoints and do not depend on each other, so
+    they run concurrently and the report takes about one round trip (two for
+    the zone, whose nameservers need its ID).
+    """
+    profile = session.profile_name
+    with ThreadPoolExecutor(max_workers=4) as executor:
+        account = executor.submit(get_account_id, profile)
+        zone = executor.submit(lookup_hosted_zone, domain_name, session)
+        registered = executor.submit(get_registered_nameservers, domain_name, session)
+        pending = executor.submit(get_pending_operations, domain_name, session)
+
+    try:
+        account_id = account.result()
+    except Exception as e:
+        logging.error(f"Failed to authenticate with AWS using profile {profile}. Error: {str(e)}")
+        sys.exit(1)
+    try:
+        hosted_zone_id, hosted_zone_ns = zone.result()
+    except Exception as e:
+        logging.error(f"Error working with Route53: {str(e)}")
+        raise
+    try:
+        pending_ops = pending.result()
+    except Exception as e:
+        logging.error(f"Error checking pending operations: {str(e)}")
+        pending_ops = None
+
+    report = {
+        'account_id': account_id,
+        'hosted_zone_id': hosted_zone_id,
+        'hosted_zone_nameservers': hosted_zone_ns,
+        'registered_nameservers': registered.result(),
+        'pending_operations': pending_ops,
+    }
+    logging.info(f"AWS preflight for {domain_name}:")
+    for label, value in (
+        ('credentials', f"profile '{profile}', account {account_id}"),
+        ('hosted zone', hosted_zone_id or 'none'),
+        ('hosted zone nameservers', ', '.join(hosted_zone_ns) or 'none'),
+        ('registered nameservers', ', '.join(report['registered_nameservers']) or 'unknown'),
+        ('pending operations', len(pending_ops) if pending_ops is not None else 'unknown'),
+    ):
+        logging.info(f"  {label + ':':<25}{value}")
+    return report
+
+def create_or_get_hosted_zone(session, domain_name, report=None, background=False):
+    """Create or get the Route53 hosted zone for the domain and sync nameservers.
 
-def create_or_get_hosted_zone(session, domain_name):
-    """Create or get the Route53 hosted zone for the domain and sync nameservers."""
-    client = session.client('route53')
+    With background=True the nameserver update runs on a separate thread;
+    call finish_delegation() to wait for it.
+    """
+    global _delegation
+    client = get_client('route53', profile=session.profile_name)
     
     try:
-        # Check if the hosted zone already exists
-        hosted_zones = client.list_hosted_zones_by_name(DNSName=domain_name)['HostedZones']
-        for zone in hosted_zones:
-            if zone['Name'] == domain_name + '.':
-                hosted_zone_id = zone['Id'].split('/')[-1]
-                logging.info(f"Found existing hosted zone for {domain_name}")
-                break
+        report = report or preflight(domain_name, session)
+        hosted_zone_id = report['hosted_zone_id']
+        hosted_zone_ns = report['hosted_zone_nameservers']
+        if hosted_zone_id:
+            logging.info(f"Found existing hosted zone for {domain_name}")
         else:
             # If not, create a new hosted zone
             response = client.create_hosted_zone(Name=domain_name, CallerReference=str(hash(domain_name)))
             hosted_zone_id = response['HostedZone']['Id'].split('/')[-1]
+            hosted_zone_ns = sorted(response['DelegationSet']['NameServers'])
             logging.info(f"Created new hosted zone for {domain_name}")
 
         # Compare and update nameservers if necessary
-        registered_ns = get_registered_nameservers(domain_name, session)
-        hosted_zone_ns = get_hosted_zone_nameservers(hosted_zone_id, session)
+        registered_ns = report['registered_nameservers']
 
         if set(registered_ns) != set(hosted_zone_ns):
             logging.info("Nameservers mismatch detected. Updating registered nameservers...")
-            if update_registered_nameservers(domain_name, hosted_zone_ns, session):
-                logging.info("Nameservers updated successfully.")
+            if background:
+                executor = ThreadPoolExecutor(max_workers=1)
+                # Off the critical path, so this one can wait for the registrar to finish
+                _delegation = executor.submit(sync_nameservers, domain_name, hosted_zone_ns, session, report['pending_operations'], True)
+                executor.shutdown(wait=False)
+                logging.info("Continuing while the nameserver update finishes in the background.")
             else:
-                logging.warning("Failed to update nameservers. Manual intervention may be required.")
+                sync_nameservers(domain_name, hosted_zone_ns, session, report['pending_operations'])
         else:
             logging.info("Nameservers are already in sync.")
 
         return hosted_zone_id
-    except ClientError as e:
+    except client.exceptions.ClientError as e:
         logging.error(f"Error working with Route53: {str(e)}")
         raise
 
-def setup_aws(domain_name):
+def setup_aws(domain_name, background_delegation=False):
     """Set up AWS configuration and hosted zone."""
-    session = setup_aws_credentials()
-    hosted_zone_id = create_or_get_hosted_zone(session, domain_name)
+    session = setup_aws_credentials(validate=False)
+    report = preflight(domain_name, session)
+    hosted_zone_id = create_or_get_hosted_zone(session, domain_name, report, background=background_delegation)
     return hosted_zone_id
 
 if __name__ == '__main__':
@@ -145,3 +306,4 @@ if __name__ == '__main__':
     if not domain_name:
         raise ValueError("DOMAIN_NAME environment variable is not set.")
     setup_aws(domain_name)
+    finish_delegation()
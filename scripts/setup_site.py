@@ -4,38 +4,63 @@ import os
 import subprocess
 import logging
 from scripts.customize_site import customize_site
+from scripts.fingerprint import hash_inputs, run_stage, record
+from scripts.build_cache import build_cache_key, cached_build
 
 # Set up logging
 logging.basicConfig(level=logging.INFO)
 
+NODE_VERSION = '18.18.0'
+DEFAULT_NPM_CACHE_DIR = os.path.join('~', '.cache', 'website-builder', 'npm')
+
+_node_version = None
+
 def check_node_version():
-    """Check if Node.js version meets requirements and set it."""
+    """Check if Node.js version meets requirements and set it.
+
+    nvm is bootstrapped at most once per process: afterwards os.environ points
+    at the right Node.js, so npm and npx can be run directly.
+    """
+    global _node_version
+    if _node_version:
+        return _node_version
+    node_bin = os.path.expanduser(f'~/.nvm/versions/node/v{NODE_VERSION}/bin')
     try:
-        # First ensure nvm is loaded and the correct version is installed
-        setup_cmd = (
-            'export NVM_DIR="$HOME/.nvm" && '
-            '[ -s "$NVM_DIR/nvm.sh" ] && . "$NVM_DIR/nvm.sh" && '
-            'nvm install 18.18.0 > /dev/null 2>&1 && '
-            'nvm alias default 18.18.0 > /dev/null 2>&1 && '
-            'nvm use default > /dev/null 2>&1 && '
-            'PATH="$NVM_DIR/versions/node/v18.18.0/bin:$PATH" && '
-            'hash -r && '
-            'node --version'
-        )
-        node_version = subprocess.check_output(['bash', '-c', setup_cmd], text=True).strip()
+        try:
+            node_version = subprocess.check_output([os.path.join(node_bin, 'node'), '--version'], text=True).strip()
+        except OSError:
+            # First ensure nvm is loaded and the correct version is installed
+            setup_cmd = (
+                'export NVM_DIR="$HOME/.nvm" && '
+                '[ -s "$NVM_DIR/nvm.sh" ] && . "$NVM_DIR/nvm.sh" && '
+                f'nvm install {NODE_VERSION} > /dev/null 2>&1 && '
+                f'nvm alias default {NODE_VERSION} > /dev/null 2>&1 && '
+                'nvm use default > /dev/null 2>&1 && '
+                f'PATH="$NVM_DIR/versions/node/v{NODE_VERSION}/bin:$PATH" && '
+                'hash -r && '
+                'node --version'
+            )
+            node_version = subprocess.check_output(['bash', '-c', setup_cmd], text=True).strip()
         
-        if not node_version.startswith('v18.18.0'):
-            raise ValueError(f"Node.js version mismatch. Got {node_version}, expected v18.18.0")
+        if not node_version.startswith(f'v{NODE_VERSION}'):
+            raise ValueError(f"Node.js version mismatch. Got {node_version}, expected v{NODE_VERSION}")
         
-        # Update environment PATH to include the correct Node.js version
-        os.environ['PATH'] = f"{os.path.expanduser('~/.nvm/versions/node/v18.18.0/bin')}:{os.environ.get('PATH', '')}"
+        # Update environment PATH to include the correct Node.js version, and share
+        # one npm download cache between checkouts (WEBSITE_NPM_CACHE_DIR)
+        os.environ['PATH'] = f"{node_bin}:{os.environ.get('PATH', '')}"
+        os.environ.setdefault('npm_config_cache', os.path.expanduser(os.environ.get('WEBSITE_NPM_CACHE_DIR', DEFAULT_NPM_CACHE_DIR)))
         
         logging.info(f"Using Node.js version: {node_version}")
-        return True
+        _node_version = node_version
+        return node_version
     except Exception as e:
         logging.error(f"Failed to set up Node.js version: {str(e)}")
         raise
 
+def dependencies_fingerprint(app_dir='next-app'):
+    """Key node_modules on package.json, package-lock.json and the Node.js version."""
+    return hash_inputs([os.path.join(app_dir, 'package.json'), os.path.join(app_dir, 'package-lock.json')], values=(check_node_version(),))
+
 def setup_nextjs_app(domain_name):
     """Set up the Next.js application."""
     # Check Node.js version before proceeding
@@ -46,46 +71,38 @@ def setup_nextjs_app(domain_name):
         logging.info("Next.js app already exists. Skipping creation.")
     else:
         logging.info("Creating Next.js app...")
-        create_cmd = (
-            'export NVM_DIR="$HOME/.nvm" && '
-            '[ -s "$NVM_DIR/nvm.sh" ] && \. "$NVM_DIR/nvm.sh" && '
-            'PATH="$NVM_DIR/versions/node/v18.18.0/bin:$PATH" && '
-            'hash -r && '
-            'npx --yes create-next-app@latest next-app '
-            '--typescript --tailwind --eslint --app --src-dir --import-alias @/* --use-npm --yes'
-        )
-        subprocess.run(['bash', '-c', create_cmd], check=True)
+        subprocess.run([
+            'npx', '--yes', 'create-next-app@latest', app_dir,
+            '--typescript', '--tailwind', '--eslint', '--app', '--src-dir', '--import-alias', '@/*', '--use-npm', '--yes'
+        ], check=True)
+        # create-next-app has just installed node_modules from the new lockfile
+        record('npm_install', dependencies_fingerprint(app_dir))
         
         # Add Next.js app to git
         logging.info("Adding Next.js app to git...")
         subprocess.run(['git', 'add', 'next-app'], check=True)
         subprocess.run(['git', 'commit', '-m', 'initial next.js app setup'], check=True)
         subprocess.run(['git', 'push'], check=True)
-    
-    # Install dependencies using the correct Node.js version
-    logging.info("Installing Node.js dependencies...")
-    install_cmd = (
-        'export NVM_DIR="$HOME/.nvm" && '
-        '[ -s "$NVM_DIR/nvm.sh" ] && \. "$NVM_DIR/nvm.sh" && '
-        'PATH="$NVM_DIR/versions/node/v18.18.0/bin:$PATH" && '
-        'hash -r && '
-        'cd next-app && npm install'
-    )
-    subprocess.run(['bash', '-c', install_cmd], check=True)
 
-def build_nextjs_app():
+def install_nextjs_dependencies(app_dir='next-app'):
+    """Install the Next.js app's npm dependencies.
+
+    With a lockfile this is a clean `npm ci` from the shared npm cache, so
+    node_modules always matches package-lock.json exactly.
+    """
+    check_node_version()
+    if os.path.exists(os.path.join(app_dir, 'package-lock.json')):
+        logging.info("Installing Node.js dependencies from package-lock.json...")
+        subprocess.run(['npm', 'ci', '--prefer-offline', '--no-audit', '--no-fund'], cwd=app_dir, check=True)
+    else:
+        logging.info("No package-lock.json found. Installing Node.js dependencies...")
+        subprocess.run(['npm', 'install', '--prefer-offline', '--no-audit', '--no-fund'], cwd=app_dir, check=True)
+
+def build_nextjs_app(app_dir='next-app'):
     """Build the Next.js app."""
+    check_node_version()
     logging.info("Building Next.js app...")
-    build_cmd = (
-        'export NVM_DIR="$HOME/.nvm" && '
-        '[ -s "$NVM_DIR/nvm.sh" ] && \\. "$NVM_DIR/nvm.sh" && '
-        'PATH="$NVM_DIR/versions/node/v18.18.0/bin:$PATH" && '
-        'hash -r && '
-        'cd next-app && '
-        'npm install && '
-        'npm run build'
-    )
-    subprocess.run(['bash', '-c', build_cmd], check=True)
+    subprocess.run(['npm', 'run', 'build'], cwd=app_dir, check=True)
     logging.info("Next.js app built successfully.")
 
 def setup_site(domain_name):
@@ -96,19 +113,33 @@ def setup_site(domain_name):
     if not os.path.exists(app_dir) or not os.path.exists(os.path.join(app_dir, 'package.json')):
         logging.info("Setting up new Next.js application...")
         setup_nextjs_app(domain_name)
-        customize_site(domain_name)
     else:
         logging.info("Next.js app already exists, checking for changes...")
-        # Always customize site to ensure latest changes are applied
-        customize_site(domain_name)
     
-    # Build the app regardless of whether it's new or existing
-    build_nextjs_app()
+    # Each step is skipped when its inputs match the last successful run
+    customize_fingerprint = hash_inputs([os.path.join('scripts', 'customize_site.py')], values=(domain_name, os.environ.get('IMAGE_WIDTHS', '')))
+    run_stage('customize_site', customize_fingerprint, customize_site, args=(domain_name,), outputs=[os.path.join(app_dir, 'next.config.js')])
+    
+    build_site(app_dir)
     logging.info("Site setup/rebuild complete!")
 
+def build_site(app_dir='next-app'):
+    """Install dependencies if needed and build, reusing cached output when possible."""
+    run_stage('npm_install', dependencies_fingerprint(app_dir), install_nextjs_dependencies, args=(app_dir,), outputs=[os.path.join(app_dir, 'node_modules')])
+    
+    # The build fingerprint doubles as the build cache key
+    build_key = build_cache_key(app_dir)
+    run_stage('nextjs_build', build_key, cached_build, args=(app_dir, lambda: build_nextjs_app(app_dir), build_key), outputs=[os.path.join(app_dir, 'out')])
+
 if __name__ == '__main__':
-    import sys
-    if len(sys.argv) != 2:
-        print("Usage: python setup_site.py <domain_name>")
-        sys.exit(1)
-    setup_site(sys.argv[1])
+    import argparse
+    parser = argparse.ArgumentParser(description="Set up, customize and build the Next.js site.")
+    parser.add_argument('domain_name', nargs='?', help='Domain name used to customize the site')
+    parser.add_argument('--build-only', action='store_true', help='Only install dependencies and build, using the build cache')
+    args = parser.parse_args()
+    if args.build_only:
+        build_site()
+    elif args.domain_name:
+        setup_site(args.domain_name)
+    else:
+        parser.error("domain_name is required unless --build-only is given")
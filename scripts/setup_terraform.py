@@ -3,14 +3,36 @@
 import subprocess
 import os
 import logging
-import boto3
 import time
 import re
+import json
+import glob
+from scripts.fingerprint import hash_inputs, run_stage
+from scripts.aws_clients import get_client, get_account_id
 
 # Set up logging
 logging.basicConfig(level=logging.INFO)
 
-def generate_tfvars(domain_name, repo_name, hosted_zone_id, account_id, website_bucket_name):
+CACHE_SETTINGS_FILE = 'cache-behaviors.json'
+
+def render_ttls(ttls):
+    """Render a TTL mapping as the body of an HCL object."""
+    return f"min_ttl = {int(ttls['min_ttl'])}, default_ttl = {int(ttls['default_ttl'])}, max_ttl = {int(ttls['max_ttl'])}"
+
+def load_cache_settings(settings_file=CACHE_SETTINGS_FILE):
+    """Load per-site cache TTL overrides, or None to keep the Terraform defaults.
+
+    The file holds an optional "default_cache_ttl" object and an optional
+    "cache_behaviors" list of {path_pattern, min_ttl, default_ttl, max_ttl}.
+    """
+    if not os.path.exists(settings_file):
+        return None
+    with open(settings_file, 'r') as f:
+        settings = json.load(f)
+    logging.info(f"Using cache behavior overrides from {settings_file}")
+    return settings
+
+def generate_tfvars(domain_name, repo_name, hosted_zone_id, account_id, website_bucket_name, cache_behaviors=None, default_cache_ttl=None):
     """Generate terraform.tfvars file with the necessary variables."""
     tfvars_content = f"""
 domain_name   = "{domain_name}"
@@ -19,6 +41,13 @@ hosted_zone_id = "{hosted_zone_id}"
 account_id    = "{account_id}"
 website_bucket_name = "{website_bucket_name}"
 """
+    if default_cache_ttl is not None:
+        tfvars_content += f"default_cache_ttl = {{ {render_ttls(default_cache_ttl)} }}\n"
+    if cache_behaviors is not None:
+        tfvars_content += "cache_behaviors = [\n"
+        for behavior in cache_behaviors:
+            tfvars_content += f"  {{ path_pattern = {json.dumps(behavior['path_pattern'])}, {render_ttls(behavior)} }},\n"
+        tfvars_content += "]\n"
     with open('terraform/terraform.tfvars', 'w') as f:
         f.write(tfvars_content)
     logging.info("Generated terraform/terraform.tfvars")
@@ -32,7 +61,7 @@ def init_and_apply(tf_state_bucket_name):
 
 def create_s3_bucket(bucket_name):
     """Create an S3 bucket for Terraform state if it doesn't exist."""
-    s3 = boto3.client('s3')
+    s3 = get_client('s3')
     
     # Ensure bucket name is valid
     bucket_name = bucket_name.lower()
@@ -58,16 +87,24 @@ def create_s3_bucket(bucket_name):
 def setup_terraform(domain_name, repo_name, hosted_zone_id):
     """Set up Terraform configuration."""
     # Get AWS account ID
-    sts = boto3.client('sts')
-    account_id = sts.get_caller_identity()["Account"]
+    account_id = get_account_id()
     
     # Create bucket names
     tf_state_bucket_name = f"tf-state-{repo_name}-{account_id}"
     tf_state_bucket_name = create_s3_bucket(tf_state_bucket_name)
     website_bucket_name = f"website-{re.sub(r'[^a-z0-9-]', '-', repo_name.lower())}-{account_id}"
     
-    generate_tfvars(domain_name, repo_name, hosted_zone_id, account_id, website_bucket_name)
-    init_and_apply(tf_state_bucket_name)
+    cache_settings = load_cache_settings() or {}
+    generate_tfvars(
+        domain_name, repo_name, hosted_zone_id, account_id, website_bucket_name,
+        cache_behaviors=cache_settings.get('cache_behaviors'),
+        default_cache_ttl=cache_settings.get('default_cache_ttl')
+    )
+    fingerprint = hash_inputs(
+        glob.glob(os.path.join('terraform', '*.tf')) + [os.path.join('terraform', 'terraform.tfvars')],
+        values=(domain_name, tf_state_bucket_name)
+    )
+    run_stage('terraform', fingerprint, init_and_apply, args=(tf_state_bucket_name,), outputs=[os.path.join('terraform', '.terraform')])
 
 if __name__ == '__main__':
     domain_name = os.getenv('DOMAIN_NAME')
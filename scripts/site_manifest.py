@@ -0,0 +1,94 @@
+# File: scripts/site_manifest.py
+
+import os
+import json
+import hashlib
+import logging
+
+# Set up logging
+logging.basicConfig(level=logging.INFO)
+
+HASH_CACHE_FILE = '.site-hash-cache.json'
+HASH_CHUNK_SIZE = 1024 * 1024
+# Below this many uncached files, process start-up costs more than it saves
+PARALLEL_HASH_THRESHOLD = 64
+
+def hash_file(file_path):
+    """Return the MD5 of a file, streamed in fixed-size chunks to bound memory."""
+    md5 = hashlib.md5()
+    with open(file_path, 'rb') as f:
+        for chunk in iter(lambda: f.read(HASH_CHUNK_SIZE), b''):
+            md5.update(chunk)
+    return md5.hexdigest()
+
+def load_hash_cache(cache_file):
+    """Load the stat-keyed hash cache, returning an empty cache if it is unusable."""
+    if not cache_file or not os.path.exists(cache_file):
+        return {}
+    try:
+        with open(cache_file, 'r') as f:
+            return json.load(f)
+    except (OSError, ValueError):
+        return {}
+
+def save_hash_cache(cache, cache_file):
+    """Persist the hash cache atomically."""
+    tmp_file = f"{cache_file}.tmp"
+    with open(tmp_file, 'w') as f:
+        json.dump(cache, f)
+    os.replace(tmp_file, cache_file)
+
+def hash_files(file_paths, max_workers=None):
+    """Hash many files, spreading the work over a process pool when it pays off."""
+    if len(file_paths) < PARALLEL_HASH_THRESHOLD:
+        return [hash_file(path) for path in file_paths]
+    from concurrent.futures import ProcessPoolExecutor
+    chunksize = max(1, len(file_paths) // ((max_workers or os.cpu_count() or 1) * 4))
+    with ProcessPoolExecutor(max_workers=max_workers) as executor:
+        return list(executor.map(hash_file, file_paths, chunksize=chunksize))
+
+def build_manifest(directory, cache_file=HASH_CACHE_FILE, max_workers=None):
+    """Record the path, size and MD5 of every file under directory.
+
+    Files whose (path, size, mtime, inode) match the hash cache are not re-read.
+    """
+    cache = load_hash_cache(cache_file)
+    new_cache = {}
+    manifest = {}
+    misses = []
+    for root, _, files in os.walk(directory):
+        for file in files:
+            file_path = os.path.join(root, file)
+            stat = os.stat(file_path)
+            rel_path = os.path.relpath(file_path, directory).replace(os.sep, '/')
+            cache_key = os.path.abspath(file_path)
+            signature = [stat.st_size, stat.st_mtime_ns, stat.st_ino]
+            cached = cache.get(cache_key)
+            if cached and cached[:3] == signature:
+                manifest[rel_path] = {'size': stat.st_size, 'hash': cached[3]}
+                new_cache[cache_key] = cached
+            else:
+                misses.append((rel_path, file_path, cache_key, signature))
+
+    if misses:
+        logging.info(f"Hashing {len(misses)} new or modified files ({len(manifest)} cached)...")
+    for (rel_path, _, cache_key, signature), file_hash in zip(misses, hash_files([m[1] for m in misses], max_workers)):
+        manifest[rel_path] = {'size': signature[0], 'hash': file_hash}
+        new_cache[cache_key] = signature + [file_hash]
+
+    if cache_file and (misses or len(new_cache) != len(cache)):
+        save_hash_cache(new_cache, cache_file)
+    return manifest
+
+def manifest_site_hash(manifest):
+    """Collapse a manifest into a single site hash (used to name releases)."""
+    file_hashes = {path: entry['hash'] for path, entry in manifest.items()}
+    content_str = json.dumps(file_hashes, sort_keys=True)
+    return hashlib.md5(content_str.encode()).hexdigest()
+
+def diff_manifests(old, new):
+    """Return sorted (added, changed, removed) paths between two manifests."""
+    added = sorted(path for path in new if path not in old)
+    changed = sorted(path for path in new if path in old and new[path] != old[path])
+    removed = sorted(path for path in old if path not in new)
+    return added, changed, removed
@@ -0,0 +1,137 @@
+# File: scripts/tracing.py
+
+import os
+import json
+import time
+import logging
+import resource
+import threading
+import contextlib
+import subprocess
+
+# Set up logging
+logging.basicConfig(level=logging.INFO)
+
+_events = []
+_lock = threading.Lock()
+_local = threading.local()
+_origin = time.perf_counter()
+_original_subprocess = {}
+
+def _children_cpu():
+    """CPU seconds (user + system) consumed by waited-for child processes so far."""
+    usage = resource.getrusage(resource.RUSAGE_CHILDREN)
+    return usage.ru_utime + usage.ru_stime
+
+@contextlib.contextmanager
+def span(name, category='phase', **args):
+    """Record a wall/CPU-timed span; spans nest naturally in the timeline."""
+    started = time.perf_counter()
+    cpu_started = time.process_time()
+    child_cpu_started = _children_cpu()
+    error = None
+    try:
+        yield
+    except BaseException as e:
+        error = f"{type(e).__name__}: {e}"
+        raise
+    finally:
+        wall = time.perf_counter() - started
+        event = {
+            'name': name,
+            'cat': category,
+            'ph': 'X',
+            'ts': round((started - _origin) * 1e6),
+            'dur': round(wall * 1e6),
+            'pid': os.getpid(),
+            'tid': threading.get_ident(),
+            'args': dict(
+                args,
+                wall_s=round(wall, 4),
+                cpu_s=round(time.process_time() - cpu_started, 4),
+                child_cpu_s=round(_children_cpu() - child_cpu_started, 4),
+            ),
+        }
+        if error:
+            event['args']['error'] = error
+        with _lock:
+            _events.append(event)
+
+def _command_name(cmd):
+    """Short, readable label for a subprocess command line."""
+    if isinstance(cmd, (list, tuple)):
+        words = [str(word) for word in cmd]
+    else:
+        words = str(cmd).split()
+    if words[:2] == ['bash', '-c'] and len(words) > 2:
+        # The nvm bootstrap prefix is noise; the real command follows the last '&&'
+        words = words[2].split('&&')[-1].split()
+    return ' '.join(words[:3])
+
+def _traced(func):
+    """Wrap a subprocess helper so each outermost call becomes a 'subprocess' span."""
+    def wrapper(*popenargs, **kwargs):
+        if getattr(_local, 'in_subprocess', False):
+            return func(*popenargs, **kwargs)
+        cmd = popenargs[0] if popenargs else kwargs.get('args')
+        _local.in_subprocess = True
+        try:
+            with span(_command_name(cmd), category='subprocess', cwd=kwargs.get('cwd') or '.'):
+                return func(*popenargs, **kwargs)
+        finally:
+            _local.in_subprocess = False
+    wrapper.__wrapped__ = func
+    return wrapper
+
+def install_subprocess_hooks():
+    """Trace every subprocess.run/call/check_call/check_output made by the pipeline."""
+    for name in ('run', 'call', 'check_call', 'check_output'):
+        if name not in _original_subprocess:
+            _original_subprocess[name] = getattr(subprocess, name)
+            setattr(subprocess, name, _traced(_original_subprocess[name]))
+
+def uninstall_subprocess_hooks():
+    """Restore the original subprocess helpers."""
+    for name, func in _original_subprocess.items():
+        setattr(subprocess, name, func)
+    _original_subprocess.clear()
+
+def get_events():
+    """Return a copy of the recorded spans, in start order."""
+    with _lock:
+        return sorted(_events, key=lambda event: event['ts'])
+
+def write_trace(path):
+    """Write the spans as a Chrome trace (open in chrome://tracing or Perfetto)."""
+    with open(path, 'w') as f:
+        json.dump({'traceEvents': get_events(), 'displayTimeUnit': 'ms'}, f, indent=1)
+    logging.info(f"Trace written to {path}")
+
+def log_summary():
+    """Log wall and CPU time per phase, with the slowest child processes of each."""
+    events = get_events()
+    for phase in (event for event in events if event['cat'] == 'phase'):
+        args = phase['args']
+        logging.info(f"{phase['name']:<22} wall {args['wall_s']:>8.2f}s  cpu {args['cpu_s']:>7.2f}s  children cpu {args['child_cpu_s']:>7.2f}s")
+        end = phase['ts'] + phase['dur']
+        children = [event for event in events if event['cat'] == 'subprocess' and phase['ts'] <= event['ts'] <= end]
+        for child in sorted(children, key=lambda event: event['dur'], reverse=True)[:3]:
+            logging.info(f"    {child['name']:<40} {child['args']['wall_s']:>8.2f}s")
+
+@contextlib.contextmanager
+def profiled(path):
+    """Run the block under cProfile and dump the stats to path (no-op if path is None)."""
+    if not path:
+        yield
+        return
+    import cProfile
+    import pstats
+    profiler = cProfile.Profile()
+    profiler.enable()
+    try:
+        yield
+    finally:
+        profiler.disable()
+        profiler.dump_stats(path)
+        logging.info(f"cProfile stats written to {path}; top functions by cumulative time:")
+        pstats.Stats(profiler).sort_stats('cumulative').print_stats(15)
@@ -0,0 +1,49 @@
+# File: scripts/upload_policy.py
+
+import fnmatch
+import mimetypes
+
+REVALIDATE = 'public, max-age=0, must-revalidate'
+IMMUTABLE = 'public, max-age=31536000, immutable'
+
+# Ordered (globs, Content-Type, Cache-Control) rules. Cache-Control comes from the
+# first matching rule; Content-Type from the first matching rule that sets one,
+# falling back to a guess from the file extension.
+UPLOAD_RULES = [
+    # Fingerprinted build output (Next.js chunks, Leptos/trunk wasm-bindgen packages)
+    (('_next/*', 'pkg/*'), None, IMMUTABLE),
+    (('*.html', '*.htm'), 'text/html; charset=utf-8', REVALIDATE),
+    # RSC payloads, data and feeds keep their names across builds
+    (('*.txt',), 'text/plain; charset=utf-8', REVALIDATE),
+    (('*.json',), 'application/json', REVALIDATE),
+    (('*.xml',), 'application/xml', REVALIDATE),
+    (('*.js', '*.mjs'), 'application/javascript', IMMUTABLE),
+    (('*.css',), 'text/css', IMMUTABLE),
+    (('*.wasm',), 'application/wasm', IMMUTABLE),
+    (('*.woff',), 'font/woff', IMMUTABLE),
+    (('*.woff2',), 'font/woff2', IMMUTABLE),
+    (('*.ttf',), 'font/ttf', IMMUTABLE),
+    (('*.otf',), 'font/otf', IMMUTABLE),
+    (('*.ico',), 'image/x-icon', IMMUTABLE),
+    (('*.jpg', '*.jpeg'), 'image/jpeg', IMMUTABLE),
+    (('*.png',), 'image/png', IMMUTABLE),
+    (('*.gif',), 'image/gif', IMMUTABLE),
+    (('*.svg',), 'image/svg+xml', IMMUTABLE),
+    (('*.webp',), 'image/webp', IMMUTABLE),
+    (('*.avif',), 'image/avif', IMMUTABLE),
+]
+DEFAULT_CACHE_CONTROL = REVALIDATE
+
+def upload_policy(key, rules=UPLOAD_RULES):
+    """Return the S3 ExtraArgs (Content-Type and Cache-Control) for an object key."""
+    content_type, cache_control = None, None
+    for patterns, rule_content_type, rule_cache_control in rules:
+        if any(fnmatch.fnmatchcase(key, pattern) for pattern in patterns):
+            cache_control = cache_control or rule_cache_control
+            content_type = content_type or rule_content_type
+            if content_type:
+                break
+    cache_control = cache_control or DEFAULT_CACHE_CONTROL
+    if content_type is None:
+        content_type = mimetypes.guess_type(key)[0] or 'binary/octet-stream'
+    return {'ContentType': content_type, 'CacheControl': cache_control}
@@ -0,0 +1,68 @@
+# File: scripts/venv_cache.py
+
+import os
+import sys
+import venv
+import shutil
+import hashlib
+import logging
+import subprocess
+
+# Imported by the entry points before they configure logging, so this module
+# leaves logging.basicConfig to them
+
+DEFAULT_VENV_CACHE_DIR = os.path.join('~', '.cache', 'website-builder', 'venvs')
+# Written last, so a venv without it is a half-finished install
+VENV_COMPLETE_MARKER = '.requirements-installed'
+GET_PIP_URL = 'https://bootstrap.pypa.io/get-pip.py'
+
+def venv_key(packages):
+    """Hash of the requirement set and the interpreter building the venv."""
+    digest = hashlib.sha256()
+    digest.update(f"{sys.implementation.name}-{sys.version}-{sys.platform}\n".encode())
+    for package in sorted(packages):
+        digest.update(f"{package}\n".encode())
+    return digest.hexdigest()[:16]
+
+def venv_python(venv_path):
+    """Path of the venv's Python executable."""
+    if sys.platform == 'win32':
+        return os.path.join(venv_path, 'Scripts', 'python.exe')
+    return os.path.join(venv_path, 'bin', 'python')
+
+def install_dependencies(python_executable, packages):
+    """Resolve and install all packages in a single pip invocation."""
+    subprocess.run([python_executable, '-m', 'pip', 'install', '--quiet', '--disable-pip-version-check', *packages], check=True)
+
+def create_venv(packages):
+    """Return a cached venv with packages installed, building it on first use.
+
+    Venvs live under ~/.cache/website-builder/venvs (WEBSITE_VENV_CACHE_DIR),
+    outside any checkout, one per requirement set and Python version, and
+    are reused across runs and entry points.
+    """
+    cache_dir = os.path.expanduser(os.environ.get('WEBSITE_VENV_CACHE_DIR', DEFAULT_VENV_CACHE_DIR))
+    venv_path = os.path.join(cache_dir, venv_key(packages))
+    if os.path.exists(os.path.join(venv_path, VENV_COMPLETE_MARKER)):
+        return venv_path
+    logging.info(f"Creating virtual environment at {venv_path}")
+    if os.path.exists(venv_path):
+        shutil.rmtree(venv_path)
+    try:
+        try:
+            venv.create(venv_path, with_pip=True)
+        except subprocess.CalledProcessError:
+            # Some distributions strip ensurepip; fall back to get-pip.py
+            venv.create(venv_path, with_pip=False, clear=True)
+            get_pip = os.path.join(venv_path, 'get-pip.py')
+            subprocess.run(['curl', '-sS', GET_PIP_URL, '-o', get_pip], check=True)
+            subprocess.run([venv_python(venv_path), get_pip, '--quiet'], check=True)
+            os.remove(get_pip)
+        install_dependencies(venv_python(venv_path), packages)
+        open(os.path.join(venv_path, VENV_COMPLETE_MARKER), 'w').close()
+    except Exception as e:
+        logging.error(f"Failed to create virtual environment: {str(e)}")
+        if os.path.exists(venv_path):
+            shutil.rmtree(venv_path)
+        raise
+    return venv_path
@@ -4,99 +4,83 @@ import os
 import subprocess
 import shutil
 import sys
-import venv
+import json
 import logging
+from concurrent.futures import ThreadPoolExecutor, wait, FIRST_COMPLETED
+from scripts.venv_cache import create_venv, venv_python
 
 logging.basicConfig(level=logging.INFO, format='%(asctime)s - %(levelname)s - %(message)s')
 
-def create_venv():
-    venv_path = 'teardown_venv'
-    try:
-        venv.create(venv_path, with_pip=True)
-        return venv_path
-    except Exception as e:
-        logging.error(f"Failed to create virtual environment: {e}")
-        return None
-
-def install_requirements(venv_path):
-    if not venv_path:
-        return
-    pip_path = os.path.join(venv_path, 'bin', 'pip')
-    try:
-        subprocess.run([pip_path, 'install', 'boto3'], check=True)
-    except subprocess.CalledProcessError as e:
-        logging.error(f"Failed to install requirements: {e}")
+REQUIRED_PACKAGES = ['boto3']
 
 def run_in_venv(venv_path):
-    if not venv_path:
-        return
-    python_path = os.path.join(venv_path, 'bin', 'python')
-    try:
-        subprocess.run([python_path, __file__, '--in-venv'], check=True)
-    except subprocess.CalledProcessError as e:
-        logging.error(f"Failed to run script in virtual environment: {e}")
-
-def cleanup_venv(venv_path):
-    if venv_path and os.path.exists(venv_path):
-        try:
-            shutil.rmtree(venv_path)
-        except Exception as e:
-            logging.error(f"Failed to remove virtual environment: {e}")
+    """Replace this process with the teardown running inside the venv."""
+    python_path = venv_python(venv_path)
+    os.execv(python_path, [python_path, os.path.abspath(__file__), '--in-venv'])
 
-def run_command(command):
+def run_command(command, cwd=None):
     try:
-        subprocess.run(command, shell=True, check=True)
+        subprocess.run(command, shell=True, check=True, cwd=cwd)
     except subprocess.CalledProcessError as e:
         logging.error(f"Command failed: {e}")
+        raise
 
-def setup_venv():
-    logging.info("Setting up virtual environment...")
-    run_command("python3 -m venv teardown_venv")
-    activate_venv()
-
-def activate_venv():
-    activate_script = os.path.join("teardown_venv", "bin", "activate_this.py")
-    if os.path.exists(activate_script):
-        with open(activate_script) as file_:
-            exec(file_.read(), dict(__file__=activate_script))
-    else:
-        logging.error(f"Activation script not found: {activate_script}")
+def read_state_bucket():
+    """Return the state bucket recorded by the last `terraform init`, if any."""
+    try:
+        with open(os.path.join('terraform', '.terraform', 'terraform.tfstate')) as f:
+            return json.load(f)['backend']['config']['bucket']
+    except (OSError, ValueError, KeyError, TypeError):
+        return None
 
-def remove_venv():
-    logging.info("Removing virtual environment...")
-    cleanup_venv("teardown_venv")
+def resolve_outputs():
+    """Read every value the other steps need once, before anything is destroyed."""
+    logging.info("Resolving Terraform outputs...")
+    state_bucket = read_state_bucket()
+    backend_config = f" -backend-config=bucket={state_bucket}" if state_bucket else ""
+    run_command(f"terraform init -input=false{backend_config}", cwd="terraform")
+    output = subprocess.check_output(['terraform', 'output', '-json'], cwd='terraform')
+    values = {name: value['value'] for name, value in json.loads(output).items()}
+    outputs = {
+        'tf_state_bucket_name': state_bucket or read_state_bucket(),
+        'website_bucket_name': values.get('s3_bucket_name'),
+        'repo_name': values.get('repo_name') or os.environ.get('REPO_NAME') or os.path.basename(os.getcwd()),
+    }
+    for name, value in outputs.items():
+        logging.info(f"  {name}: {value}")
+    return outputs
+
+def empty_website_bucket(outputs):
+    """Empty the website bucket so terraform destroy can delete it."""
+    from scripts.s3_purge import empty_bucket
+    if not outputs['website_bucket_name']:
+        logging.error("website_bucket_name not found in Terraform outputs")
+        return
+    empty_bucket(outputs['website_bucket_name'])
 
 def terraform_destroy():
     logging.info("Running Terraform destroy...")
-    try:
-        os.chdir("terraform")
-        run_command("terraform init")
-        run_command("terraform destroy -auto-approve")
-    except Exception as e:
-        logging.error(f"Failed to run Terraform destroy: {e}")
-    finally:
-        os.chdir("..")
-
-def empty_and_remove_s3_buckets():
-    print("Emptying and removing S3 buckets...")
-    import boto3
-    s3 = boto3.resource('s3')
-    
-    tf_state_bucket_name = get_terraform_variable('tf_state_bucket_name')
-    website_bucket_name = get_terraform_variable('website_bucket_name')
-    
-    for bucket_name in [tf_state_bucket_name, website_bucket_name]:
-        if not bucket_name:
-            print(f"Error: {bucket_name} not found in Terraform outputs")
-            continue
-
-        bucket = s3.Bucket(bucket_name)
-        bucket.objects.all().delete()
-        bucket.delete()
+    run_command("terraform destroy -auto-approve -input=false", cwd="terraform")
+
+def remove_website_bucket(outputs):
+    """Delete the website bucket if terraform destroy left it behind."""
+    from scripts.s3_purge import empty_and_delete_bucket
+    if outputs['website_bucket_name']:
+        empty_and_delete_bucket(outputs['website_bucket_name'])
+
+def remove_state_bucket(outputs):
+    """Delete the (versioned) state bucket; only safe once terraform is done with it."""
+    from scripts.s3_purge import empty_and_delete_bucket
+    if not outputs['tf_state_bucket_name']:
+        logging.error("Terraform state bucket not found in .terraform/terraform.tfstate")
+        return
+    # Deletes every version and delete marker in parallel, so versioned
+    # state buckets can be removed too
+    empty_and_delete_bucket(outputs['tf_state_bucket_name'])
 
-def delete_github_repo():
+def delete_github_repo(outputs):
     print("Deleting GitHub repository...")
-    repo_name = get_terraform_variable('repo_name')
+    repo_name = outputs['repo_name']
     
     if not repo_name:
         print("Error: repo_name not found in Terraform outputs")
@@ -104,54 +88,85 @@ def delete_github_repo():
 
     run_command(f"gh repo delete {repo_name} --yes")
 
-def delete_local_repo():
-    print("Deleting local repository...")
-    current_dir = os.getcwd()
-    parent_dir = os.path.dirname(current_dir)
-    os.chdir(parent_dir)
-    shutil.rmtree(current_dir)
-
-def get_terraform_variable(var_name):
-    try:
-        output = subprocess.check_output(['terraform', 'output', '-raw', var_name], cwd='terraform')
-        return output.decode('utf-8').strip()
-    except subprocess.CalledProcessError:
-        return None
+# step: (function, steps it depends on, whether it receives the resolved outputs)
+TEARDOWN_STEPS = {
+    'resolve_outputs': (resolve_outputs, (), False),
+    'empty_website_bucket': (empty_website_bucket, ('resolve_outputs',), True),
+    'delete_github_repo': (delete_github_repo, ('resolve_outputs',), True),
+    'terraform_destroy': (terraform_destroy, ('empty_website_bucket',), False),
+    'remove_website_bucket': (remove_website_bucket, ('terraform_destroy',), True),
+    'remove_state_bucket': (remove_state_bucket, ('terraform_destroy',), True),
+}
+
+def run_steps(steps=TEARDOWN_STEPS, max_workers=4):
+    """Run each step as soon as all its dependencies succeeded; return {step: status}.
+
+    Steps whose dependencies failed are skipped, independent ones still run.
+    """
+    status = {}
+    outputs = {}
+    with ThreadPoolExecutor(max_workers=max_workers) as executor:
+        running = {}
+        while len(status) < len(steps):
+            for name, (func, deps, takes_outputs) in steps.items():
+                if name in status or name in running.values():
+                    continue
+                if any(status.get(dep) in ('failed', 'skipped') for dep in deps):
+                    logging.warning(f"Skipping {name}: a step it depends on did not succeed.")
+                    status[name] = 'skipped'
+                elif all(status.get(dep) == 'ok' for dep in deps):
+                    logging.info(f"Starting {name}...")
+                    running[executor.submit(func, outputs) if takes_outputs else executor.submit(func)] = name
+            if not running:
+                continue
+            done, _ = wait(running, return_when=FIRST_COMPLETED)
+            for future in done:
+                name = running.pop(future)
+                try:
+                    result = future.result()
+                    if name == 'resolve_outputs':
+                        outputs.update(result)
+                    status[name] = 'ok'
+                    logging.info(f"Finished {name}.")
+                except Exception as e:
+                    status[name] = 'failed'
+                    logging.error(f"Step {name} failed: {e}")
+    return status
 
 def main():
+    """Run the teardown steps; return True only if every one of them succeeded."""
     try:
-        setup_venv()
-        terraform_destroy()
-        empty_and_remove_s3_buckets()
-        delete_github_repo()
+        status = run_steps()
+        failed = [name for name, result in status.items() if result != 'ok']
+        if failed:
+            logging.error(f"Teardown incomplete; steps not completed: {', '.join(failed)}")
+            return False
         logging.info("Teardown complete. This script will now exit.")
+        return True
     except Exception as e:
         logging.error(f"An error occurred: {e}")
-    finally:
-        remove_venv()
-        logging.info("Virtual environment removed.")
+        return False
 
 def run_teardown():
     current_dir = os.getcwd()
     parent_dir = os.path.dirname(current_dir)
+    if not main():
+        # The checkout holds the Terraform state and config a retry needs
+        logging.warning(f"Keeping the local repository at {current_dir}. Fix the errors above, then resume with: cd {current_dir} && python3 teardown-website.py")
+        return
+    logging.info("Deleting local repository...")
+    os.chdir(parent_dir)
     try:
-        main()
-    finally:
-        logging.info("Deleting local repository...")
-        os.chdir(parent_dir)
-        try:
-            shutil.rmtree(current_dir)
-        except Exception as e:
-            logging.error(f"Failed to delete local repository: {e}")
+        shutil.rmtree(current_dir)
+    except Exception as e:
+        logging.error(f"Failed to delete local repository: {e}")
 
 if __name__ == "__main__":
     if '--in-venv' not in sys.argv:
-        venv_path = create_venv()
-        if venv_path:
-            try:
-                install_requirements(venv_path)
-                run_in_venv(venv_path)
-            finally:
-                cleanup_venv(venv_path)
+        try:
+            venv_path = create_venv(REQUIRED_PACKAGES)
+        except Exception:
+            sys.exit(1)
+        run_in_venv(venv_path)
     else:
         run_teardown()
\ No newline at end of file
@@ -98,6 +98,67 @@ resource "aws_cloudfront_origin_access_control" "oac" {
   signing_protocol                  = "sigv4"
 }
 
+# CloudFront cache policies, one per distinct TTL combination. Accept-Encoding
+# is part of the cache key so Brotli and gzip variants are cached separately.
+locals {
+  behavior_ttl_keys = distinct([
+    for behavior in var.cache_behaviors : "${behavior.min_ttl}-${behavior.default_ttl}-${behavior.max_ttl}"
+  ])
+
+  cache_ttls = merge(
+    { "default" = var.default_cache_ttl },
+    {
+      for key in local.behavior_ttl_keys : key => {
+        min_ttl     = tonumber(split("-", key)[0])
+        default_ttl = tonumber(split("-", key)[1])
+        max_ttl     = tonumber(split("-", key)[2])
+      }
+    }
+  )
+}
+
+resource "aws_cloudfront_cache_policy" "cache" {
+  for_each = local.cache_ttls
+
+  name        = "${var.repo_name}-${each.key}"
+  comment     = "Cache policy for ${var.domain_name}"
+  min_ttl     = each.value.min_ttl
+  default_ttl = each.value.default_ttl
+  max_ttl     = each.value.max_ttl
+
+  parameters_in_cache_key_and_forwarded_to_origin {
+    cookies_config {
+      cookie_behavior = "none"
+    }
+    headers_config {
+      header_behavior = "none"
+    }
+    query_strings_config {
+      query_string_behavior = "none"
+    }
+    enable_accept_encoding_brotli = true
+    enable_accept_encoding_gzip   = true
+  }
+}
+
+# The deploy keeps its index (_deploy/) and release manifests (_releases/) in
+# the bucket next to the site; viewers get a 404 for them instead of the objects
+locals {
+  internal_path_patterns = ["_deploy/*", "_releases/*"]
+}
+
+resource "aws_cloudfront_function" "deny_internal" {
+  name    = "${var.repo_name}-deny-internal"
+  runtime = "cloudfront-js-2.0"
+  comment = "Hide deploy bookkeeping objects for ${var.domain_name}"
+  publish = true
+  code    = <<-EOT
+    function handler(event) {
+      return { statusCode: 404, statusDescription: 'Not Found' };
+    }
+  EOT
+}
+
 # CloudFront Distribution
 resource "aws_cloudfront_distribution" "website_distribution" {
   depends_on = [aws_acm_certificate_validation.cert_validation]
@@ -117,19 +178,45 @@ resource "aws_cloudfront_distribution" "website_distribution" {
     allowed_methods  = ["GET", "HEAD", "OPTIONS"]
     cached_methods   = ["GET", "HEAD"]
     target_origin_id = "S3-${aws_s3_bucket.website_bucket.id}"
+    cache_policy_id  = aws_cloudfront_cache_policy.cache["default"].id
 
-    forwarded_values {
-      query_string = false
-      cookies {
-        forward = "none"
+    viewer_protocol_policy = "redirect-to-https"
+    compress               = true
+  }
+
+  # Listed before the cache behaviors so patterns such as *.json cannot match first
+  dynamic "ordered_cache_behavior" {
+    for_each = local.internal_path_patterns
+
+    content {
+      path_pattern     = ordered_cache_behavior.value
+      allowed_methods  = ["GET", "HEAD"]
+      cached_methods   = ["GET", "HEAD"]
+      target_origin_id = "S3-${aws_s3_bucket.website_bucket.id}"
+      cache_policy_id  = aws_cloudfront_cache_policy.cache["default"].id
+
+      viewer_protocol_policy = "redirect-to-https"
+
+      function_association {
+        event_type   = "viewer-request"
+        function_arn = aws_cloudfront_function.deny_internal.arn
       }
     }
+  }
 
-    viewer_protocol_policy = "redirect-to-https"
-    compress               = true
-    min_ttl                = 0
-    default_ttl            = 0
-    max_ttl                = 0
+  dynamic "ordered_cache_behavior" {
+    for_each = var.cache_behaviors
+
+    content {
+      path_pattern     = ordered_cache_behavior.value.path_pattern
+      allowed_methods  = ["GET", "HEAD", "OPTIONS"]
+      cached_methods   = ["GET", "HEAD"]
+      target_origin_id = "S3-${aws_s3_bucket.website_bucket.id}"
+      cache_policy_id  = aws_cloudfront_cache_policy.cache["${ordered_cache_behavior.value.min_ttl}-${ordered_cache_behavior.value.default_ttl}-${ordered_cache_behavior.value.max_ttl}"].id
+
+      viewer_protocol_policy = "redirect-to-https"
+      compress               = true
+    }
   }
 
   custom_error_response {
@@ -159,6 +246,12 @@ resource "aws_cloudfront_distribution" "website_distribution" {
   }
 
   aliases = [var.domain_name]
+
+  # The origin path is switched between releases/<id> prefixes by
+  # `scripts.deploy_website --release` and must not be reset on apply
+  lifecycle {
+    ignore_changes = [origin]
+  }
 }
 
 # S3 bucket policy
@@ -14,3 +14,8 @@ output "website_url" {
   value       = "https://${var.domain_name}"
   description = "The URL of the website."
 }
+
+output "repo_name" {
+  description = "The repository name the site was created from"
+  value       = var.repo_name
+}
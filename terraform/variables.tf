@@ -24,3 +24,47 @@ variable "website_bucket_name" {
   description = "The name of the S3 bucket for the website"
   type        = string
 }
+
+variable "default_cache_ttl" {
+  description = "TTLs (seconds) for paths without an ordered cache behavior, mainly HTML and RSC payloads"
+  type = object({
+    min_ttl     = number
+    default_ttl = number
+    max_ttl     = number
+  })
+  default = {
+    min_ttl     = 60
+    default_ttl = 60
+    max_ttl     = 300
+  }
+}
+
+variable "cache_behaviors" {
+  description = "Ordered, path-based cache behaviors; the first matching path_pattern wins"
+  type = list(object({
+    path_pattern = string
+    min_ttl      = number
+    default_ttl  = number
+    max_ttl      = number
+  }))
+  default = [
+    { path_pattern = "_next/*", min_ttl = 86400, default_ttl = 31536000, max_ttl = 31536000 },
+    { path_pattern = "pkg/*", min_ttl = 86400, default_ttl = 31536000, max_ttl = 31536000 },
+    { path_pattern = "*.wasm", min_ttl = 86400, default_ttl = 31536000, max_ttl = 31536000 },
+    { path_pattern = "*.js", min_ttl = 86400, default_ttl = 31536000, max_ttl = 31536000 },
+    { path_pattern = "*.mjs", min_ttl = 86400, default_ttl = 31536000, max_ttl = 31536000 },
+    { path_pattern = "*.css", min_ttl = 86400, default_ttl = 31536000, max_ttl = 31536000 },
+    { path_pattern = "*.woff2", min_ttl = 86400, default_ttl = 31536000, max_ttl = 31536000 },
+    { path_pattern = "*.woff", min_ttl = 86400, default_ttl = 31536000, max_ttl = 31536000 },
+    { path_pattern = "*.ttf", min_ttl = 86400, default_ttl = 31536000, max_ttl = 31536000 },
+    { path_pattern = "*.otf", min_ttl = 86400, default_ttl = 31536000, max_ttl = 31536000 },
+    { path_pattern = "*.png", min_ttl = 86400, default_ttl = 31536000, max_ttl = 31536000 },
+    { path_pattern = "*.jpg", min_ttl = 86400, default_ttl = 31536000, max_ttl = 31536000 },
+    { path_pattern = "*.jpeg", min_ttl = 86400, default_ttl = 31536000, max_ttl = 31536000 },
+    { path_pattern = "*.gif", min_ttl = 86400, default_ttl = 31536000, max_ttl = 31536000 },
+    { path_pattern = "*.svg", min_ttl = 86400, default_ttl = 31536000, max_ttl = 31536000 },
+    { path_pattern = "*.webp", min_ttl = 86400, default_ttl = 31536000, max_ttl = 31536000 },
+    { path_pattern = "*.avif", min_ttl = 86400, default_ttl = 31536000, max_ttl = 31536000 },
+    { path_pattern = "*.ico", min_ttl = 86400, default_ttl = 31536000, max_ttl = 31536000 },
+  ]
+}